@@ -0,0 +1,523 @@
+"""
+Offline benchmarks of the hei_chart.py pipeline.
+
+Every stage of a run is timed against synthetic trade tabs shaped like the
+real "(+50) ETH 3m" sheets, with local stand-ins for the Google Sheets API and
+the Telegram Bot API, so no credentials or network access are needed:
+
+    python benchmark.py                                   # 1k, 100k and 1M rows per tab
+    python benchmark.py --rows 1000 100000 --output before.json
+    python benchmark.py --rows 1000 100000 --compare before.json
+
+Each size runs in a fresh process: a cold run that loads every tab, then an
+update run after ``--append`` rows were added to each tab. The JSON report
+holds the time spent in every stage (stages nest, e.g. date conversion is
+part of parsing) and the peak memory of the process, and ``--compare`` exits
+non-zero when a stage got slower than ``--threshold`` allows.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import functools
+import itertools
+import subprocess
+import tempfile
+import threading
+import re
+import email.parser
+import email.policy
+import urllib.parse
+from datetime import datetime
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BASE_DIR = Path(__file__).resolve().parent
+
+DEFAULT_ROWS = [1000, 100000, 1000000]
+# Two strategies with a 3m and a 5m timeframe each, like the live spreadsheet
+DEFAULT_TABS = ['(+50) ETH 3m', '(+50) ETH 5m', '(+110) ETH 3m', '(+110) ETH 5m']
+HEADER = ['Date', 'Time', 'Pair', 'Side', 'Entry', 'Exit', 'Date', 'Time', 'Qty', 'Win Rate', 'PnL', 'Est. Fee']
+# Excel serial day of the first synthetic trade (01/04/2025) and the days the trades span
+FIRST_TRADE_DAY = 45748
+TRADE_DAYS = 200
+
+# Settings every benchmark run uses, whatever the local .env says
+BENCHMARK_ENV = {
+    'TELEGRAM_BOT_TOKEN': '123456:benchmark',
+    'TELEGRAM_CHAT_ID': '1',
+    'SPREADSHEET_ID': 'benchmark',
+    'SYNC_MODE': 'incremental',
+    'REPORT_START_DATE': '2025-04-13',
+    'RENDER_PROFILE': 'telegram',
+    # Charts are rendered in-process, one after another, so each is timed on its own
+    'RENDER_WORKERS': '1',
+    'RENDER_CACHE_ENTRIES': '0',
+    'TELEGRAM_ALBUMS': 'true',
+    'LOG_LEVEL': 'WARNING',
+}
+
+# Pipeline functions timed as stages, by hei_chart attribute
+STAGES = {
+    'revision': 'get_spreadsheet_revision',
+    'registry': 'load_strategy_registry',
+    'fetch': 'fetch_sheet_values_batch',
+    'parse': 'parse_sheet_values',
+    'date_conversion': 'excel_serials_to_datetime',
+    'statistics': 'load_trade_stats',
+    'save': 'save_figure',
+}
+# TelegramDelivery methods timed together as the 'send' stage
+SEND_METHODS = ['send_message', 'send_photo', 'send_album']
+
+def synthetic_rows(rows, seed, first_day=FIRST_TRADE_DAY):
+    """
+    Encode ``rows`` trades from ``first_day`` on as the JSON rows the Sheets API returns.
+
+    Trades are spread evenly over ``TRADE_DAYS`` days; a few have no fee yet,
+    and like in the API response their trailing blank cell is left out.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    moments = np.sort(rng.uniform(0, TRADE_DAYS, rows)) + first_day
+    days = moments.astype(int)
+    times = np.round(moments - days, 6).tolist()
+    entries = np.round(rng.uniform(1500, 4000, rows), 2)
+    exits = np.round(entries * rng.normal(1, 0.01, rows), 2)
+    quantities = np.round(rng.uniform(0.1, 5, rows), 3).tolist()
+    pnl = np.round((exits - entries) * np.array(quantities), 2).tolist()
+    fees = np.round(rng.uniform(0, 25, rows), 2).tolist()
+    open_trades = (rng.random(rows) < 0.001).tolist()
+    days, entries, exits = days.tolist(), entries.tolist(), exits.tolist()
+
+    lines = []
+    for i in range(rows):
+        cells = (
+            f'{days[i]},{times[i]},"ETHUSDT","{"Long" if pnl[i] >= 0 else "Short"}",'
+            f'{entries[i]},{exits[i]},{days[i]},{times[i]},{quantities[i]},'
+            f'"{"Yes" if pnl[i] > 0 else "No"}",{pnl[i]}'
+        )
+        lines.append(f'[{cells}]' if open_trades[i] else f'[{cells},{fees[i]}]')
+    return [line.encode() for line in lines]
+
+def synthetic_tab(rows, seed):
+    """
+    Build a trade tab with a header and ``rows`` trades.
+
+    Returns the encoded rows joined by commas and the byte offset of every
+    row, so any slice of rows can be served without re-encoding.
+    """
+    encoded = [json.dumps(HEADER).encode()] + synthetic_rows(rows, seed)
+    offsets = list(itertools.accumulate((len(line) + 1 for line in encoded), initial=0))
+    return b','.join(encoded), offsets
+
+def append_rows(tab, rows, seed):
+    """Return ``tab`` with ``rows`` more trades, starting the day after its last one."""
+    data, offsets = tab
+    last_day = json.loads(data[offsets[-2]:offsets[-1] - 1])[0] if len(offsets) > 2 else FIRST_TRADE_DAY
+    encoded = synthetic_rows(rows, seed, first_day=last_day + 1)
+    shifted = (offset + offsets[-1] for offset in itertools.accumulate(len(line) + 1 for line in encoded))
+    return data + b',' + b','.join(encoded), offsets + list(shifted)
+
+class SyntheticSheetsClient:
+    """
+    Stand-in for ``hei_chart.GoogleSheetsClient`` serving synthetic tabs.
+
+    Ranges are answered from the pre-encoded rows and decoded with ``json``,
+    like the real client does with the API's response.
+    """
+
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.revision = 1
+        self.requests = 0
+        self.bytes = 0
+
+    def _values(self, range_name):
+        match = re.fullmatch(r"(.+)!A(\d*):L(\d*)", range_name)
+        data, offsets = self.tabs[match.group(1)]
+        first = int(match.group(2) or 1) - 1
+        last = min(int(match.group(3) or len(offsets) - 1), len(offsets) - 1)
+        if first >= last:
+            return []
+        payload = data[offsets[first]:offsets[last] - 1]
+        self.bytes += len(payload)
+        return json.loads(b'[' + payload + b']')
+
+    def get_values(self, spreadsheet_id, range_name):
+        self.requests += 1
+        return self._values(range_name)
+
+    def batch_get_values(self, spreadsheet_id, range_names):
+        self.requests += 1
+        return [self._values(range_name) for range_name in range_names]
+
+    def get_revision(self, spreadsheet_id):
+        return str(self.revision)
+
+    def get_sheet_titles(self, spreadsheet_id):
+        return list(self.tabs)
+
+class FakeBotAPI:
+    """
+    Local stand-in for the Telegram Bot API, for ``TelegramDelivery(base_url=...)``.
+
+    Accepts every method, answers sends with messages carrying a photo
+    ``file_id`` and records the method, its parameters (but not the uploaded
+    files), the request size and whether the message reported an error.
+    Messages queued with ``send_update`` are served to ``getUpdates`` like
+    Telegram does: until an offset past them confirms them, with long polling
+    while there are none.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.updated = threading.Condition()
+        message_ids = itertools.count(1)
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rsplit('/', 1)[-1]
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    # Every field but the uploaded files
+                    header = f'Content-Type: {content_type}\r\n\r\n'.encode()
+                    form = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+                    fields = [(part.get_param('name', header='content-disposition'), part.get_payload(decode=True).decode())
+                              for part in form.iter_parts() if part.get_filename() is None]
+                else:
+                    fields = urllib.parse.parse_qsl(body.decode())
+                params = {}
+                for name, value in fields:
+                    try:
+                        params[name] = json.loads(value)
+                    except ValueError:
+                        params[name] = value
+                api.calls.append({'method': method, 'params': params, 'bytes': len(body),
+                                  'error': '❌'.encode() in body or b'\\u274c' in body})
+
+                def message():
+                    i = next(message_ids)
+                    return {
+                        'message_id': i, 'date': 0, 'chat': {'id': 1, 'type': 'group'},
+                        'photo': [{'file_id': f'file{i}', 'file_unique_id': f'unique{i}', 'width': 1, 'height': 1}],
+                    }
+
+                if method == 'getMe':
+                    result = {'id': 1, 'is_bot': True, 'first_name': 'benchmark', 'username': 'benchmark_bot'}
+                elif method == 'getUpdates':
+                    result = api.get_updates(int(params.get('offset', 0)), float(params.get('timeout', 0)))
+                elif method == 'sendMediaGroup':
+                    result = [message() for _ in range(max(len(re.findall(rb'"type":\s*"photo"', body)), 1))]
+                elif method.startswith('send'):
+                    result = message()
+                else:
+                    result = True
+
+                reply = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/bot"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def send_update(self, text, chat_id=1):
+        """Queue a message with ``text`` sent to the chat ``chat_id``; returns its update."""
+        with self.updated:
+            update_id = next(self.update_ids)
+            update = {'update_id': update_id, 'message': {
+                'message_id': 1000 + update_id, 'date': int(time.time()), 'text': text,
+                'chat': {'id': chat_id, 'type': 'group'}, 'from': {'id': 2, 'is_bot': False, 'first_name': 'user'},
+            }}
+            self.updates.append(update)
+            self.updated.notify_all()
+        return update
+
+    def get_updates(self, offset, timeout):
+        """The updates from ``offset`` on (the last ``-offset`` ones if negative), waiting ``timeout`` for one."""
+        with self.updated:
+            self.updated.wait_for(lambda: any(u['update_id'] >= offset for u in self.updates), timeout)
+            if offset < 0:
+                self.updates = self.updates[offset:]
+            else:
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            return list(self.updates)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class StageTimer:
+    """Accumulates the wall time and calls of every stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        entry = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+
+    def wrap(self, owner, name, stage):
+        """Time every call of ``owner.name`` (a function or a coroutine function) as ``stage``."""
+        import inspect
+
+        function = getattr(owner, name)
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+        setattr(owner, name, timed)
+
+    def take(self):
+        stages, self.stages = self.stages, {}
+        return {stage: {'seconds': round(entry['seconds'], 6), 'calls': entry['calls']}
+                for stage, entry in sorted(stages.items())}
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_size(rows, tab_names, append, workdir):
+    """Benchmark a cold run and an update run with ``rows`` trades per tab, in this process."""
+    os.environ.update(BENCHMARK_ENV, CACHE_DIR=str(workdir / 'cache'),
+                      METRICS_TEXTFILE=str(workdir / 'hei_chart.prom'), METRICS_JSONL=str(workdir / 'metrics.jsonl'))
+    os.chdir(workdir)
+    (workdir / 'charts').mkdir(exist_ok=True)
+    sys.path.insert(0, str(BASE_DIR))
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    import hei_chart
+
+    timer = StageTimer()
+    for stage, name in STAGES.items():
+        timer.wrap(hei_chart, name, stage)
+    for name in dir(hei_chart):
+        if name.startswith('create_') and name.endswith('_chart'):
+            timer.wrap(hei_chart, name, f'chart:{name}')
+    for name in SEND_METHODS:
+        timer.wrap(hei_chart.TelegramDelivery, name, 'send')
+
+    start = time.perf_counter()
+    tabs = {name: synthetic_tab(rows, seed) for seed, name in enumerate(tab_names)}
+    generate_seconds = time.perf_counter() - start
+
+    sheets = hei_chart._sheets_client = SyntheticSheetsClient(tabs)
+    telegram = FakeBotAPI()
+    hei_chart.TELEGRAM_API_URL = telegram.url
+    hei_chart.import_runtime_dependencies()
+
+    scenarios = {}
+    for scenario in ('cold', 'update'):
+        if scenario == 'update':
+            sheets.tabs = {name: append_rows(tab, append, seed + 1000)
+                           for seed, (name, tab) in enumerate(sheets.tabs.items())}
+            sheets.revision += 1
+        sheets.requests = sheets.bytes = 0
+        del telegram.calls[:]
+        timer.take()
+
+        start = time.perf_counter()
+        hei_chart.run_once()
+        total = time.perf_counter() - start
+
+        scenarios[scenario] = {
+            'total_seconds': round(total, 6),
+            'stages': timer.take(),
+            'sheets_requests': sheets.requests,
+            'sheets_bytes': sheets.bytes,
+            'telegram_requests': len(telegram.calls),
+            'telegram_bytes': sum(call['bytes'] for call in telegram.calls),
+            'errors': sum(call['error'] for call in telegram.calls),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    telegram.close()
+    return {
+        'rows_per_tab': rows,
+        'tabs': len(tab_names),
+        'appended_rows_per_tab': append,
+        'generate_seconds': round(generate_seconds, 6),
+        'scenarios': scenarios,
+    }
+
+def benchmark_size(rows, tab_names, append):
+    """Run ``run_size`` in a fresh interpreter and return its results."""
+    with tempfile.TemporaryDirectory(prefix='hei_chart_benchmark_') as workdir:
+        result_path = Path(workdir) / 'result.json'
+        command = [
+            sys.executable, str(Path(__file__).resolve()), '--child', str(rows), str(result_path),
+            '--append', str(append), '--tabs', *tab_names,
+        ]
+        # The pipeline prints its progress; keep the benchmark output readable
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark of {rows} rows failed:\n{completed.stderr.strip()}")
+        return json.loads(result_path.read_text())
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def merge_repeats(results):
+    """Keep the fastest of repeated results of one size, stage by stage."""
+    merged = json.loads(json.dumps(results[0]))
+    for result in results[1:]:
+        for scenario, values in result['scenarios'].items():
+            target = merged['scenarios'][scenario]
+            target['total_seconds'] = min(target['total_seconds'], values['total_seconds'])
+            target['errors'] = max(target['errors'], values['errors'])
+            for stage, entry in values['stages'].items():
+                if stage in target['stages']:
+                    target['stages'][stage]['seconds'] = min(target['stages'][stage]['seconds'], entry['seconds'])
+    return merged
+
+def report_rows(report):
+    """Flatten a report into ``{(rows, scenario, stage): seconds}``; 'total' is the whole run."""
+    flat = {}
+    for result in report['results']:
+        for scenario, values in result['scenarios'].items():
+            flat[(result['rows_per_tab'], scenario, 'total')] = values['total_seconds']
+            for stage, entry in values['stages'].items():
+                flat[(result['rows_per_tab'], scenario, stage)] = entry['seconds']
+    return flat
+
+def print_report(report):
+    for result in report['results']:
+        print(f"\n{result['rows_per_tab']:,} rows x {result['tabs']} tabs "
+              f"(+{result['appended_rows_per_tab']:,} per tab for the update run)")
+        scenarios = result['scenarios']
+        print(f"  {'stage':45} " + ''.join(f"{scenario:>12}" for scenario in scenarios))
+        stages = sorted({stage for values in scenarios.values() for stage in values['stages']})
+        for stage in ['total'] + stages:
+            cells = []
+            for values in scenarios.values():
+                seconds = values['total_seconds'] if stage == 'total' else values['stages'].get(stage, {}).get('seconds')
+                cells.append(f"{seconds * 1000:>10.1f}ms" if seconds is not None else f"{'-':>12}")
+            print(f"  {stage:45} " + ''.join(cells))
+        print(f"  {'peak memory':45} " + ''.join(f"{values['peak_rss_mb'] or 0:>10.0f}MB" for values in scenarios.values()))
+
+def compare_reports(baseline, current, threshold, noise):
+    """
+    Print every stage's change against ``baseline`` and return the regressions.
+
+    A stage regresses when it is more than ``threshold`` (a fraction) and
+    more than ``noise`` seconds slower than in the baseline.
+    """
+    before, after = report_rows(baseline), report_rows(current)
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created')}):")
+    print(f"  {'rows':>9} {'run':7} {'stage':45} {'baseline':>11} {'current':>11} {'change':>8}")
+    for key in sorted(set(before) & set(after)):
+        rows, scenario, stage = key
+        old, new = before[key], after[key]
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > noise
+        if regressed:
+            regressions.append(key)
+        print(f"  {rows:>9,} {scenario:7} {stage:45} {old * 1000:>9.1f}ms {new * 1000:>9.1f}ms "
+              f"{change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chart pipeline offline on synthetic trade tabs.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="trades per tab, one benchmark per size (default: %(default)s)")
+    parser.add_argument('--tabs', nargs='+', default=DEFAULT_TABS,
+                        help="names of the synthetic strategy tabs (default: the four ETH tabs)")
+    parser.add_argument('--append', type=int, default=100,
+                        help="trades appended to every tab before the update run (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="runs per size; the fastest time of every stage is kept (default: %(default)s)")
+    parser.add_argument('--output', default='benchmark.json',
+                        help="where to write the JSON report (default: %(default)s)")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="earlier JSON report to compare with; exits with status 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="slowdown of a stage, as a fraction, that counts as a regression (default: %(default)s)")
+    parser.add_argument('--noise', type=float, default=0.005,
+                        help="slowdowns of fewer seconds than this are ignored (default: %(default)s)")
+    parser.add_argument('--child', nargs=2, metavar=('ROWS', 'RESULT'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        rows, result_path = int(args.child[0]), Path(args.child[1])
+        result = run_size(rows, args.tabs, args.append, result_path.parent)
+        result_path.write_text(json.dumps(result))
+        return 0
+
+    results = []
+    for rows in args.rows:
+        print(f"Benchmarking {rows:,} rows per tab...", flush=True)
+        results.append(merge_repeats([benchmark_size(rows, args.tabs, args.append) for _ in range(args.repeat)]))
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': BENCHMARK_ENV,
+        'results': results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print_report(report)
+    print(f"\nReport written to {args.output}")
+
+    status = 0
+    errors = [(result['rows_per_tab'], scenario) for result in results
+              for scenario, values in result['scenarios'].items() if values['errors']]
+    if errors:
+        print(f"\nThe pipeline reported errors in: {', '.join(f'{rows:,} rows ({scenario})' for rows, scenario in errors)}")
+        status = 1
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare_reports(baseline, report, args.threshold, args.noise)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
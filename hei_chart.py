@@ -1,99 +1,699 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-import numpy as np
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import pickle
-from telegram import Bot
 import asyncio
 import logging
-import matplotlib.dates as mdates
-from google.oauth2 import service_account
-from googleapiclient.errors import HttpError
-import urllib.parse
 import sys
+import importlib.util
+import subprocess
 from dotenv import load_dotenv
 from pathlib import Path
 import logging.handlers
 import shutil
+import hashlib
+import threading
+import time
+import gc
+import signal
+import argparse
+import functools
+import contextvars
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import re
+import itertools
+import operator
+import copy
+import io
+import json
+import contextlib
+import collections
+import tempfile
+import urllib.parse
+
+def _lazy_import(name):
+    """
+    Return module ``name``, deferring the actual import until first attribute access.
+
+    Keeps heavy libraries off the startup path of runs that never use them
+    (``--help``, configuration errors, ``--import-profile``).
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+pd = _lazy_import('pandas')
+np = _lazy_import('numpy')
+
+def _pyplot():
+    """Import pyplot on first use, rendering off-screen with the Agg backend."""
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging with rotation
 BASE_DIR = Path(__file__).resolve().parent
 ASSETS_DIR = BASE_DIR / 'assets'
 LOG_DIR = BASE_DIR / 'logs'
 CHARTS_DIR = BASE_DIR / 'charts'
-
-# Create necessary directories
-ASSETS_DIR.mkdir(exist_ok=True)
-LOG_DIR.mkdir(exist_ok=True)
-CHARTS_DIR.mkdir(exist_ok=True)
+CACHE_DIR = Path(os.getenv('CACHE_DIR', str(BASE_DIR / 'cache')))
 
 # Update the logo path configuration
 LOGO_PATH = os.getenv('LOGO_PATH', str(ASSETS_DIR / 'utgl.png'))
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.handlers.RotatingFileHandler(
-            LOG_DIR / 'hei_chart.log',
-            maxBytes=1024*1024,  # 1MB
-            backupCount=5
-        ),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def configure_logging():
+    """Configure logging with rotation to LOG_DIR and to stdout."""
+    LOG_DIR.mkdir(exist_ok=True)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        handlers=[
+            logging.handlers.RotatingFileHandler(
+                LOG_DIR / 'hei_chart.log',
+                maxBytes=1024*1024,  # 1MB
+                backupCount=5
+            ),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
 # Configuration from environment variables
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', str(BASE_DIR / 'credentials.json'))
+# 'service_account' (default) or 'oauth' for the interactive installed-app flow
+GOOGLE_AUTH_MODE = os.getenv('GOOGLE_AUTH_MODE', 'service_account')
 
-# Ensure required environment variables are set
-required_env_vars = ['TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID', 'SPREADSHEET_ID']
-missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-if missing_vars:
-    raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
+# Daemon schedule: runs start every RUN_INTERVAL seconds, aligned to the
+# wall clock and shifted by RUN_OFFSET seconds (3600/0 = top of every hour)
+RUN_INTERVAL = int(os.getenv('RUN_INTERVAL', '3600'))
+RUN_OFFSET = int(os.getenv('RUN_OFFSET', '0'))
+# Time limit for a single pipeline run, in seconds
+RUN_TIMEOUT = int(os.getenv('RUN_TIMEOUT', '1800'))
 
-# Create necessary directories
-CHARTS_DIR.mkdir(exist_ok=True)
+# Telegram delivery: concurrent requests, messages allowed per minute in the
+# chat (20 is Telegram's group limit), albums per strategy, Bot API endpoint
+TELEGRAM_MAX_CONCURRENT = int(os.getenv('TELEGRAM_MAX_CONCURRENT', '4'))
+TELEGRAM_RATE_LIMIT = int(os.getenv('TELEGRAM_RATE_LIMIT', '20'))
+TELEGRAM_ALBUMS = os.getenv('TELEGRAM_ALBUMS', 'true').lower() in ('1', 'true', 'yes')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
 
-async def send_telegram_message(message):
-    """Send a message to Telegram."""
+# Worker processes for parallel chart rendering (1 renders in-process)
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(min(os.cpu_count() or 1, 4))))
+# Rendered charts kept in the content-hash render cache (0 disables it)
+RENDER_CACHE_ENTRIES = int(os.getenv('RENDER_CACHE_ENTRIES', '200'))
+
+# Output size and encoding of rendered charts. A profile sets the pixel size
+# (``width`` in pixels, or ``dpi``), the PIL ``format``, an optional palette
+# of ``colors``, and passes any other keys to the encoder.
+RENDER_PROFILES = {
+    # Telegram shows photos at most 1280px wide and recompresses larger ones
+    'telegram': {'width': 1280, 'format': 'PNG', 'colors': 256, 'optimize': True},
+    'archive': {'dpi': 300, 'format': 'WEBP', 'lossless': True},
+    'print': {'dpi': 300, 'format': 'JPEG', 'quality': 95, 'optimize': True},
+}
+RENDER_PROFILE = os.getenv('RENDER_PROFILE', 'telegram')
+
+# Sheet sync: 'incremental' only fetches rows appended since the last run,
+# 'full' re-downloads every range on every run
+SYNC_MODE = os.getenv('SYNC_MODE', 'incremental')
+# Number of already-ingested rows re-fetched to detect edits to earlier rows
+SYNC_OVERLAP_ROWS = int(os.getenv('SYNC_OVERLAP_ROWS', '20'))
+# Seconds after which an incrementally synced range is downloaded in full again,
+# so edits to rows older than the overlap are picked up too (0 never does)
+SYNC_FULL_INTERVAL = int(os.getenv('SYNC_FULL_INTERVAL', '86400'))
+# Ranges fetched per batchGet request
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', '100'))
+# Default directory of the snapshots written by --record and read by --replay
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', str(BASE_DIR / 'snapshots'))
+
+# Tabs named like "(+50) ETH 3m" are strategies: an offset, an asset and a timeframe
+STRATEGY_TAB_PATTERN = os.getenv(
+    'STRATEGY_TAB_PATTERN',
+    r'^\((?P<offset>[+-]\d+)\)\s+(?P<asset>\w+)\s+(?P<timeframe>\d+[mhd])$'
+)
+# Columns read from every strategy tab
+STRATEGY_TAB_COLUMNS = 'A:L'
+# Trades before this date are left out of the reports
+REPORT_START_DATE = os.getenv('REPORT_START_DATE', '2025-04-13')
+# Look-back windows of the fee report sent with every update, e.g. "7d,30d,90d"
+# (units m, h and d); empty sends no report
+REPORT_WINDOWS = os.getenv('REPORT_WINDOWS', '7d,30d,90d')
+
+# Per-stage metrics of every run: a Prometheus textfile (rewritten after each
+# run) and a JSON lines file (one line appended per run). Empty disables either.
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', str(LOG_DIR / 'hei_chart.prom'))
+METRICS_JSONL = os.getenv('METRICS_JSONL', str(LOG_DIR / 'metrics.jsonl'))
+# HTTP chart server started with --serve: address and rendered images kept in memory
+CHART_SERVER_HOST = os.getenv('CHART_SERVER_HOST', '127.0.0.1')
+CHART_SERVER_PORT = int(os.getenv('CHART_SERVER_PORT', '8080'))
+CHART_SERVER_CACHE_ENTRIES = int(os.getenv('CHART_SERVER_CACHE_ENTRIES', '64'))
+# Bot commands (--bot): seconds during which a chart just sent to the chat is
+# not sent again for the same command
+TELEGRAM_COMMAND_COOLDOWN = int(os.getenv('TELEGRAM_COMMAND_COOLDOWN', '60'))
+
+def validate_config(telegram=True):
+    """Ensure required environment variables are set; the Telegram ones only if ``telegram``."""
+    # A replayed snapshot sets SPREADSHEET_ID itself, so check the settings rather than the environment
+    required_settings = {
+        'TELEGRAM_BOT_TOKEN': TELEGRAM_BOT_TOKEN,
+        'TELEGRAM_CHAT_ID': TELEGRAM_CHAT_ID,
+        'SPREADSHEET_ID': SPREADSHEET_ID,
+    }
+    if not telegram:
+        del required_settings['TELEGRAM_BOT_TOKEN'], required_settings['TELEGRAM_CHAT_ID']
+    missing_vars = [var for var, value in required_settings.items() if not value]
+    if missing_vars:
+        raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
+    if RENDER_PROFILE not in RENDER_PROFILES:
+        raise EnvironmentError(
+            f"Unknown RENDER_PROFILE {RENDER_PROFILE!r}, expected one of: {', '.join(RENDER_PROFILES)}"
+        )
+    try:
+        missing_groups = {'offset', 'asset', 'timeframe'} - set(re.compile(STRATEGY_TAB_PATTERN).groupindex)
+    except re.error as e:
+        raise EnvironmentError(f"Invalid STRATEGY_TAB_PATTERN: {e}")
+    if missing_groups:
+        raise EnvironmentError(f"STRATEGY_TAB_PATTERN is missing groups: {', '.join(sorted(missing_groups))}")
+    try:
+        report_windows()
+    except ValueError as e:
+        raise EnvironmentError(f"Invalid REPORT_WINDOWS: {e}")
+
+def import_runtime_dependencies():
+    """Import every heavy library a full pipeline run uses."""
+    import matplotlib.dates  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+    import google_auth_httplib2  # noqa: F401
+    from google.oauth2 import service_account  # noqa: F401
+    import telegram  # noqa: F401
+
+    # Attribute access resolves the lazily imported modules
+    pd.DataFrame, np.ndarray
+    _pyplot()
+
+# Run metrics
+#
+# Pipeline stages (sheet fetches, parsing, date conversion, each chart,
+# saving and each Telegram send) are wrapped in ``measure``. It records the
+# stage's duration, the process's peak RSS when it finished and whatever the
+# stage counts itself: rows processed, bytes transferred, output file size.
+# Charts rendered in a pool worker send their records back with the result.
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where it is unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class _ErrorCounter(logging.Handler):
+    """Counts the errors logged by a run, not those of other threads logging meanwhile."""
+
+    def __init__(self, metrics):
+        super().__init__(logging.ERROR)
+        self.metrics = metrics
+        self.count = 0
+
+    def emit(self, record):
+        if _run_metrics.get() is self.metrics:
+            self.count += 1
+
+class RunMetrics:
+    """
+    Stage records of one pipeline run and its outcome.
+
+    Every record is a dict with the ``stage``, its ``labels``, ``seconds`` and
+    ``peak_rss_bytes``, plus the ``rows``, ``bytes`` and ``file_bytes`` the
+    stage counted. Errors logged while the run is active are counted too.
+    """
+
+    def __init__(self, interval=None, timeout=None):
+        self.interval = interval or RUN_INTERVAL
+        self.timeout = timeout
+        self.records = []
+        self.started = time.time()
+        self.seconds = None
+        self.status = None
+        self._counter = _ErrorCounter(self)
+
+    @property
+    def errors(self):
+        return self._counter.count
+
+    def start(self):
+        self._start = time.perf_counter()
+        logger.addHandler(self._counter)
+
+    def finish(self, status):
+        logger.removeHandler(self._counter)
+        self.seconds = time.perf_counter() - self._start
+        self.status = status
+
+    def peak_rss_bytes(self):
+        """Highest peak RSS of the run, including its render workers."""
+        peaks = [record['peak_rss_bytes'] for record in self.records if record['peak_rss_bytes']]
+        peaks.append(peak_rss_bytes() or 0)
+        return max(peaks)
+
+    def stage_totals(self):
+        """Records summed per stage and labels; peak RSS is the highest of them."""
+        totals = {}
+        for record in self.records:
+            key = (record['stage'], tuple(sorted(record['labels'].items())))
+            total = totals.setdefault(key, {'calls': 0, 'seconds': 0.0, 'peak_rss_bytes': 0})
+            total['calls'] += 1
+            total['seconds'] += record['seconds']
+            total['peak_rss_bytes'] = max(total['peak_rss_bytes'], record['peak_rss_bytes'] or 0)
+            for field in ('rows', 'bytes', 'file_bytes'):
+                if field in record:
+                    total[field] = total.get(field, 0) + record[field]
+        return totals
+
+    def to_json(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'status': self.status,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 6),
+            'interval_seconds': self.interval,
+            'timeout_seconds': self.timeout,
+            'peak_rss_bytes': self.peak_rss_bytes(),
+            'stages': [dict(record, seconds=round(record['seconds'], 6)) for record in self.records],
+        }
+
+    def to_prometheus(self):
+        """The run in the Prometheus text exposition format."""
+        def labels(pairs):
+            escaped = []
+            for name, value in pairs:
+                value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                escaped.append(f'{name}="{value}"')
+            return '{' + ','.join(escaped) + '}'
+
+        run_metrics = [
+            ('run_duration_seconds', 'Wall time of the last run.', self.seconds),
+            ('run_interval_seconds', 'Scheduled time between runs.', self.interval),
+            ('run_interval_ratio', 'Share of the run interval the last run took.', self.seconds / self.interval),
+            ('run_timeout_seconds', 'Time limit of a run, 0 for none.', self.timeout or 0),
+            ('run_success', 'Whether the last run finished without errors.', int(self.status == 'ok' and not self.errors)),
+            ('run_errors', 'Errors logged during the last run.', self.errors),
+            ('run_peak_rss_bytes', 'Peak resident memory of the last run.', self.peak_rss_bytes()),
+            ('run_last_timestamp_seconds', 'Unix time the last run finished.', self.started + self.seconds),
+        ]
+        lines = []
+        for name, help_text, value in run_metrics:
+            lines += [f'# HELP hei_chart_{name} {help_text}', f'# TYPE hei_chart_{name} gauge', f'hei_chart_{name} {value}']
+
+        totals = self.stage_totals()
+        stage_metrics = [
+            ('stage_duration_seconds', 'seconds', 'Time spent in a stage during the last run.'),
+            ('stage_calls', 'calls', 'Times a stage ran during the last run.'),
+            ('stage_rows', 'rows', 'Rows a stage processed during the last run.'),
+            ('stage_bytes', 'bytes', 'Bytes a stage transferred during the last run.'),
+            ('stage_file_bytes', 'file_bytes', 'Size of the files a stage wrote during the last run.'),
+            ('stage_peak_rss_bytes', 'peak_rss_bytes', 'Peak resident memory of the process that ran a stage.'),
+        ]
+        for name, field, help_text in stage_metrics:
+            samples = [
+                f'hei_chart_{name}{labels((("stage", stage),) + stage_labels)} {total[field]}'
+                for (stage, stage_labels), total in totals.items() if field in total
+            ]
+            if samples:
+                lines += [f'# HELP hei_chart_{name} {help_text}', f'# TYPE hei_chart_{name} gauge'] + samples
+        return '\n'.join(lines) + '\n'
+
+# Metrics of the run in progress, if any. A context variable, so only the
+# run's own tasks and threads (see ``_in_thread``) record into them, never the
+# chart server or the bot answering from their threads meanwhile
+_run_metrics = contextvars.ContextVar('run_metrics', default=None)
+
+@contextlib.contextmanager
+def measure(stage, **labels):
+    """
+    Time a stage of the current run.
+
+    Yields the stage's record, to which the stage adds its ``rows``,
+    ``bytes`` or ``file_bytes``. Outside a run nothing is recorded.
+    """
+    record = {'stage': stage, 'labels': labels}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['peak_rss_bytes'] = peak_rss_bytes()
+        metrics = _run_metrics.get()
+        if metrics is not None:
+            metrics.records.append(record)
+
+def write_run_metrics(metrics):
+    """Write a finished run to ``METRICS_TEXTFILE`` and append it to ``METRICS_JSONL``."""
     try:
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        await bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
-        logger.info("Message sent successfully")
+        if METRICS_TEXTFILE:
+            path = Path(METRICS_TEXTFILE)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # node_exporter's textfile collector must never see a partial file
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_text(metrics.to_prometheus())
+            os.replace(tmp_path, path)
+        if METRICS_JSONL:
+            path = Path(METRICS_JSONL)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(json.dumps(metrics.to_json(), ensure_ascii=False) + '\n')
     except Exception as e:
-        logger.error(f"Error sending message: {str(e)}")
+        logger.warning(f"Could not write run metrics: {str(e)}")
+
+# Held while the file_id cache is read and written back: the update and the
+# bot each keep a TelegramDelivery of their own and save to the same file
+_file_ids_lock = threading.Lock()
+
+class TelegramDelivery:
+    """
+    Telegram delivery for a whole run over one Bot and one HTTP session.
+
+    Use as ``async with TelegramDelivery() as telegram:``. Sends can be awaited
+    concurrently: at most ``max_concurrent`` requests are in flight, no more
+    than ``rate_limit`` messages go to the chat per ``rate_period`` seconds
+    (Telegram's group limit is 20 a minute), and RetryAfter replies are waited
+    out and retried. Like the original helpers, failed sends are logged rather
+    than raised.
+
+    Photos sent with a ``cache_key`` (see ``chart_cache_key``) remember the
+    ``file_id`` Telegram assigned to the upload. Sending the same content again
+    reuses that ``file_id`` instead of uploading the bytes.
+    """
+
+    def __init__(self, token=None, chat_id=None, max_concurrent=None,
+                 rate_limit=None, rate_period=60, base_url=None):
+        self.token = token or TELEGRAM_BOT_TOKEN
+        self.chat_id = chat_id or TELEGRAM_CHAT_ID
+        self.max_concurrent = max_concurrent or TELEGRAM_MAX_CONCURRENT
+        self.rate_limit = rate_limit or TELEGRAM_RATE_LIMIT
+        self.rate_period = rate_period
+        self.base_url = base_url or TELEGRAM_API_URL
+        self.bot = None
+        self._semaphore = None
+        self._rate_lock = None
+        self._sent_at = []
+        self._file_ids_path = CACHE_DIR / 'telegram_file_ids.json'
+        self.file_ids = {}
+        self._file_ids_changed = False
+        self._forgotten_file_ids = set()
+
+    async def __aenter__(self):
+        from telegram import Bot
+        from telegram.request import HTTPXRequest
+
+        request = HTTPXRequest(
+            connection_pool_size=self.max_concurrent,
+            read_timeout=30,
+            write_timeout=30,
+            media_write_timeout=60,
+            pool_timeout=None
+        )
+        self.bot = Bot(token=self.token, base_url=self.base_url, request=request)
+        await self.bot.initialize()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._rate_lock = asyncio.Lock()
+        self._load_file_ids()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._save_file_ids()
+        await self.bot.shutdown()
+
+    def _load_file_ids(self):
+        try:
+            with open(self._file_ids_path) as f:
+                self.file_ids = json.load(f).get(str(self.bot.id), {})
+        except FileNotFoundError:
+            self.file_ids = {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Telegram file_id cache: {str(e)}")
+            self.file_ids = {}
+
+    def _save_file_ids(self, max_entries=500):
+        """
+        Merge the file_ids learnt since the last save into the cache file.
+
+        Entries another session stored meanwhile are kept, except the ones this
+        session saw rejected; the file is replaced through a temporary file of
+        its own, so concurrent saves never write to the same one.
+        """
+        if not self._file_ids_changed:
+            return
+        with _file_ids_lock:
+            try:
+                with open(self._file_ids_path) as f:
+                    stored = json.load(f)
+            except Exception:
+                stored = {}
+            file_ids = {
+                cache_key: file_id for cache_key, file_id in stored.get(str(self.bot.id), {}).items()
+                if cache_key not in self._forgotten_file_ids and cache_key not in self.file_ids
+            }
+            file_ids.update(self.file_ids)
+            self.file_ids = stored[str(self.bot.id)] = dict(list(file_ids.items())[-max_entries:])
+
+            self._file_ids_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._file_ids_path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, self._file_ids_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._file_ids_changed = False
+            self._forgotten_file_ids.clear()
+
+    def _remember_file_id(self, cache_key, message):
+        if cache_key and message is not None and message.photo:
+            self.file_ids.pop(cache_key, None)
+            self.file_ids[cache_key] = message.photo[-1].file_id
+            self._forgotten_file_ids.discard(cache_key)
+            self._file_ids_changed = True
+
+    def _forget_file_id(self, cache_key):
+        if self.file_ids.pop(cache_key, None) is not None:
+            self._forgotten_file_ids.add(cache_key)
+            self._file_ids_changed = True
+
+    async def _wait_for_rate_limit(self, messages):
+        """Reserve ``messages`` sends within the chat's sliding rate window."""
+        async with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                self._sent_at = [t for t in self._sent_at if now - t < self.rate_period]
+                if len(self._sent_at) + messages <= self.rate_limit or not self._sent_at:
+                    self._sent_at.extend([now] * messages)
+                    return
+                await asyncio.sleep(self.rate_period - (now - self._sent_at[0]))
+
+    async def _call(self, method, messages=1, attempts=3, uploaded_bytes=0, **kwargs):
+        from telegram.error import RetryAfter
+
+        with measure('send', method=method) as record:
+            record['bytes'] = uploaded_bytes
+            for attempt in range(attempts):
+                await self._wait_for_rate_limit(messages)
+                async with self._semaphore:
+                    try:
+                        return await getattr(self.bot, method)(chat_id=self.chat_id, **kwargs)
+                    except RetryAfter as e:
+                        if attempt == attempts - 1:
+                            raise
+                        delay = e.retry_after
+                        delay = delay.total_seconds() if hasattr(delay, 'total_seconds') else delay
+                        logger.warning(f"Telegram flood control, retrying {method} in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def send_message(self, message, **kwargs):
+        """Send a message to Telegram."""
+        try:
+            await self._call('send_message', uploaded_bytes=len(message.encode()), text=message, **kwargs)
+            logger.info("Message sent successfully")
+        except Exception as e:
+            logger.error(f"Error sending message: {str(e)}")
+
+    async def send_photo(self, photo_path, caption=None, cache_key=None, **kwargs):
+        """
+        Send a photo to Telegram, by ``file_id`` if this content was uploaded before.
+
+        ``photo_path`` may also be the image itself, or None to only send by
+        ``file_id``. Returns whether the photo was sent.
+        """
+        from telegram.error import BadRequest
+
+        name = photo_path if isinstance(photo_path, str) else caption
+        try:
+            file_id = self.file_ids.get(cache_key) if cache_key else None
+            if file_id:
+                try:
+                    await self._call('send_photo', photo=file_id, caption=caption, **kwargs)
+                    logger.info(f"Photo {name} sent by file_id")
+                    return True
+                except BadRequest as e:
+                    logger.warning(f"Cached file_id for {name} rejected, uploading: {str(e)}")
+                    self._forget_file_id(cache_key)
+
+            if photo_path is None:
+                return False
+            if isinstance(photo_path, bytes):
+                photo, size = contextlib.nullcontext(photo_path), len(photo_path)
+            else:
+                logger.info(f"Attempting to send photo: {photo_path}")
+                if not os.path.exists(photo_path):
+                    logger.error(f"File not found: {photo_path}")
+                    return False
+                photo, size = open(photo_path, 'rb'), os.path.getsize(photo_path)
+
+            with photo as content:
+                message = await self._call('send_photo', uploaded_bytes=size,
+                                           photo=content, caption=caption, **kwargs)
+            self._remember_file_id(cache_key, message)
+            logger.info(f"Photo {name} sent successfully")
+            return True
+        except Exception as e:
+            logger.error(f"Error sending photo {name}: {str(e)}")
+            return False
+
+    async def send_album(self, photos):
+        """
+        Send ``(photo_path, caption[, cache_key])`` entries as one media group album.
+
+        Albums hold 2-10 photos; a single photo is sent on its own and longer
+        lists are split into several albums. Photos with a known ``file_id`` are
+        not uploaded again.
+        """
+        from telegram import InputMediaPhoto
+        from telegram.error import BadRequest
+
+        photos = [tuple(photo) + (None,) * (3 - len(photo)) for photo in photos]
+        photos = [photo for photo in photos if photo[2] in self.file_ids or os.path.exists(photo[0])]
+        if len(photos) == 1:
+            return await self.send_photo(*photos[0])
+
+        for start in range(0, len(photos), 10):
+            chunk = photos[start:start + 10]
+            paths = [path for path, _, _ in chunk]
+            for use_file_ids in (True, False):
+                handles = []
+                try:
+                    logger.info(f"Attempting to send album: {paths}")
+                    media = []
+                    for path, caption, cache_key in chunk:
+                        file_id = self.file_ids.get(cache_key) if use_file_ids and cache_key else None
+                        if file_id is None:
+                            handles.append(open(path, 'rb'))
+                        media.append(InputMediaPhoto(media=file_id or handles[-1], caption=caption))
+                    uploaded_bytes = sum(os.fstat(handle.fileno()).st_size for handle in handles)
+                    messages = await self._call('send_media_group', messages=len(media),
+                                                uploaded_bytes=uploaded_bytes, media=media)
+                    for (_, _, cache_key), message in zip(chunk, messages or ()):
+                        self._remember_file_id(cache_key, message)
+                    logger.info(f"Album {paths} sent successfully ({len(handles)} uploaded)")
+                    break
+                except BadRequest as e:
+                    if not use_file_ids or len(handles) == len(chunk):
+                        logger.error(f"Error sending album {paths}: {str(e)}")
+                        break
+                    logger.warning(f"Cached file_ids for album {paths} rejected, uploading: {str(e)}")
+                    for _, _, cache_key in chunk:
+                        self._forget_file_id(cache_key)
+                except Exception as e:
+                    logger.error(f"Error sending album {paths}: {str(e)}")
+                    break
+                finally:
+                    for handle in handles:
+                        handle.close()
+
+class FileDelivery:
+    """
+    Stand-in for ``TelegramDelivery`` that writes an update to ``directory``.
+
+    Each delivery gets a folder of its own, named after the time it started.
+    Messages are appended to ``messages.txt`` there, and photos are copied
+    next to it, numbered in the order they were sent. Nothing reaches Telegram.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory) / time.strftime('%Y%m%d-%H%M%S')
+        self._photos = itertools.count(1)
+
+    async def __aenter__(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Writing the update to {self.directory} instead of sending it to Telegram")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def send_message(self, message, **kwargs):
+        with open(self.directory / 'messages.txt', 'a', encoding='utf-8') as f:
+            f.write(message + '\n\n')
+        return True
+
+    async def send_photo(self, photo_path, caption=None, cache_key=None, **kwargs):
+        if photo_path is None or not os.path.exists(photo_path):
+            return False
+        target = self.directory / f"{next(self._photos):03d}_{os.path.basename(photo_path)}"
+        shutil.copyfile(photo_path, target)
+        await self.send_message(f"[{target.name}] {caption or ''}")
+        return True
+
+    async def send_album(self, photos):
+        for photo in photos:
+            await self.send_photo(*photo)
+
+# Builds the delivery of each run's update; --replay swaps in FileDelivery
+_delivery_factory = TelegramDelivery
+
+def use_replay_sandbox(directory=None):
+    """
+    Keep the runs of this process away from production, for replaying a snapshot.
+
+    Caches and run metrics go to ``directory`` (a new temporary directory by
+    default) instead of ``CACHE_DIR`` and the log directory, and updates are
+    written to its ``sent`` folder by ``FileDelivery``. Returns the directory.
+    """
+    global CACHE_DIR, METRICS_TEXTFILE, METRICS_JSONL, _delivery_factory
+    directory = Path(directory or tempfile.mkdtemp(prefix='hei_chart_replay-'))
+    CACHE_DIR = directory / 'cache'
+    METRICS_TEXTFILE = str(directory / 'hei_chart.prom')
+    METRICS_JSONL = str(directory / 'metrics.jsonl')
+    _delivery_factory = functools.partial(FileDelivery, directory / 'sent')
+    logger.info(f"Replay output goes to {directory}")
+    return directory
+
+async def send_telegram_message(message):
+    """Send a message to Telegram."""
+    async with TelegramDelivery() as telegram:
+        await telegram.send_message(message)
 
 async def send_telegram_photo(photo_path, caption=None):
     """Send a photo to Telegram."""
-    try:
-        logger.info(f"Attempting to send photo: {photo_path}")
-        if not os.path.exists(photo_path):
-            logger.error(f"File not found: {photo_path}")
-            return
-            
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        with open(photo_path, 'rb') as photo:
-            await bot.send_photo(
-                chat_id=TELEGRAM_CHAT_ID,
-                photo=photo,
-                caption=caption
-            )
-        logger.info(f"Photo {photo_path} sent successfully")
-    except Exception as e:
-        logger.error(f"Error sending photo {photo_path}: {str(e)}")
+    async with TelegramDelivery() as telegram:
+        await telegram.send_photo(photo_path, caption)
 
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = [
@@ -101,895 +701,2347 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive.readonly'
 ]
 
-def get_google_sheets_service():
-    """Get or create Google Sheets service."""
-    creds = None
-    
-    # The file token.pickle stores the user's access and refresh tokens
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-            
-    # If there are no (valid) credentials available, let the user log in
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-            
-        # Save the credentials for the next run
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+class _ByteCountingHttp:
+    """Wraps an ``httplib2.Http``-like object, counting the response body bytes it receives."""
 
-    return build('sheets', 'v4', credentials=creds)
+    def __init__(self, http):
+        self.http = http
+        self.bytes_received = 0
 
-def excel_number_to_datetime(excel_date, excel_time=0):
-    """Convert Excel serial number date and time to datetime."""
-    from datetime import datetime, timedelta
-    
-    # Excel's date system has two epochs:
-    # 1. 1900 system: day 1 is 1/1/1900 (most common)
-    # 2. 1904 system: day 1 is 1/1/1904
-    
-    # We'll use the 1900 system
-    excel_epoch = datetime(1899, 12, 30)  # Excel's epoch is actually 12/30/1899
-    
-    try:
-        # Convert Excel date (days since epoch)
-        if isinstance(excel_date, str):
-            excel_date = float(excel_date)
-        days = timedelta(days=int(excel_date))
-        
-        # Convert Excel time (fraction of a day)
-        if isinstance(excel_time, str):
-            excel_time = float(excel_time) if excel_time else 0
-        seconds = int(excel_time * 24 * 3600)  # Convert to seconds
-        time_delta = timedelta(seconds=seconds)
-        
-        # Combine date and time
-        return excel_epoch + days + time_delta
-    except Exception as e:
-        print(f"Error converting Excel date/time: {excel_date}, {excel_time}")
-        print(f"Error details: {str(e)}")
-        return None
+    def request(self, *args, **kwargs):
+        response, content = self.http.request(*args, **kwargs)
+        self.bytes_received += len(content or b'')
+        return response, content
 
-def load_data_from_sheets(SPREADSHEET_ID, RANGE_NAME):
-    """Load data from Google Sheets."""
-    try:
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+class GoogleSheetsClient:
+    """
+    Long-lived Google Sheets/Drive client shared by every loader.
+
+    Credentials are loaded once and their access token is reused until it
+    expires (``AuthorizedHttp`` refreshes it on demand). Services are built
+    from the discovery documents bundled with google-api-python-client, so no
+    discovery request is made, and all calls go through one ``httplib2.Http``
+    that keeps its HTTPS connections alive between requests.
+
+    ``auth_mode`` is either ``'service_account'`` (the default, reading
+    ``CREDENTIALS_PATH``) or ``'oauth'``, the interactive installed-app flow
+    that caches the user's tokens in ``token_path``.
+    """
+
+    def __init__(self, credentials_path=None, auth_mode=None, token_path='token.pickle', timeout=60):
+        self.credentials_path = credentials_path or CREDENTIALS_PATH
+        self.auth_mode = auth_mode or GOOGLE_AUTH_MODE
+        self.token_path = token_path
+        self.timeout = timeout
+        self._credentials = None
+        self._http = None
+        self._sheets = None
+        self._drive = None
+        # httplib2 connections must not be shared between threads
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            if self.auth_mode == 'oauth':
+                self._credentials = self._load_oauth_credentials()
+            else:
+                self._credentials = self._load_service_account_credentials()
+        return self._credentials
+
+    def _load_service_account_credentials(self):
         # Check if credentials file exists
-        if not os.path.exists(CREDENTIALS_PATH):
-            raise FileNotFoundError(f"Credentials file not found at {CREDENTIALS_PATH}")
-
-        # Load credentials with broader scope
-        credentials = service_account.Credentials.from_service_account_file(
-            CREDENTIALS_PATH,
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive.readonly'
-            ]
+        if not os.path.exists(self.credentials_path):
+            raise FileNotFoundError(f"Credentials file not found at {self.credentials_path}")
+
+        from google.oauth2 import service_account
+        return service_account.Credentials.from_service_account_file(
+            self.credentials_path,
+            scopes=SCOPES
         )
 
-        # Build the service
-        service = build('sheets', 'v4', credentials=credentials)
+    def _load_oauth_credentials(self):
+        # Only interactive logins need the OAuth flow
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
 
-        # Call the Sheets API
-        sheet = service.spreadsheets()
-        
-        print(f"Requesting range: {RANGE_NAME}")  # Debug print
-        
-        result = sheet.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=RANGE_NAME,
-            valueRenderOption='UNFORMATTED_VALUE'
-        ).execute()
-        values = result.get('values', [])
-
-        if not values:
-            print('No data found.')
-            return pd.DataFrame()
-
-        # Get headers and handle duplicates
-        headers = values[0]
-        unique_headers = []
-        header_counts = {}
-        
-        # Keep track of which columns to drop
-        columns_to_drop = []
+        creds = None
         
-        for i, header in enumerate(headers):
-            if not header:  # Skip empty headers
-                unique_headers.append(f"Column_{i}")
-                continue
+        # The token file stores the user's access and refresh tokens
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
                 
-            if header in header_counts:
-                header_counts[header] += 1
-                # For Date and Time columns, use number suffix
-                if header in ['Date', 'Time']:
-                    unique_headers.append(f"{header}{header_counts[header]}")
-                    columns_to_drop.append(i)
-                else:
-                    unique_headers.append(f"{header}_{header_counts[header]}")
+        # If there are no (valid) credentials available, let the user log in
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
             else:
-                header_counts[header] = 1
-                unique_headers.append(header)
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    self.credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+                
+            # Save the credentials for the next run
+            with open(self.token_path, 'wb') as token:
+                pickle.dump(creds, token)
+
+        return creds
+
+    @property
+    def http(self):
+        if self._http is None:
+            import google_auth_httplib2
+            import httplib2
+            self._http = _ByteCountingHttp(google_auth_httplib2.AuthorizedHttp(
+                self.credentials,
+                http=httplib2.Http(timeout=self.timeout)
+            ))
+        return self._http
+
+    @property
+    def bytes_received(self):
+        """Response body bytes received by this client so far."""
+        return self._http.bytes_received if self._http is not None else 0
+
+    def _build(self, service_name, version):
+        from googleapiclient.discovery import build
+        return build(
+            service_name, version,
+            http=self.http,
+            static_discovery=True,
+            cache_discovery=False
+        )
+
+    @property
+    def sheets(self):
+        if self._sheets is None:
+            self._sheets = self._build('sheets', 'v4')
+        return self._sheets
+
+    @property
+    def drive(self):
+        if self._drive is None:
+            self._drive = self._build('drive', 'v3')
+        return self._drive
+
+    def get_values(self, spreadsheet_id, range_name):
+        """Return the unformatted cell values of one range."""
+        with self._lock:
+            result = self.sheets.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueRenderOption='UNFORMATTED_VALUE'
+            ).execute()
+        return result.get('values', [])
+
+    def batch_get_values(self, spreadsheet_id, range_names):
+        """
+        Return the unformatted cell values of several ranges.
+
+        Ranges are requested ``SHEETS_BATCH_SIZE`` at a time, so hundreds of
+        ranges take a handful of requests without overlong request URLs.
+        """
+        range_names = list(range_names)
+        values = []
+        for start in range(0, len(range_names), SHEETS_BATCH_SIZE):
+            batch = range_names[start:start + SHEETS_BATCH_SIZE]
+            with self._lock:
+                result = self.sheets.spreadsheets().values().batchGet(
+                    spreadsheetId=spreadsheet_id,
+                    ranges=batch,
+                    valueRenderOption='UNFORMATTED_VALUE'
+                ).execute()
+
+            # valueRanges come back in the same order as the requested ranges
+            value_ranges = result.get('valueRanges', [])
+            if len(value_ranges) != len(batch):
+                raise ValueError(
+                    f"batchGet returned {len(value_ranges)} ranges for {len(batch)} requested"
+                )
+            values.extend(value_range.get('values', []) for value_range in value_ranges)
+        return values
+
+    def get_sheet_titles(self, spreadsheet_id):
+        """Return the titles of the spreadsheet's tabs, in order, from one metadata request."""
+        with self._lock:
+            result = self.sheets.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties.title'
+            ).execute()
+        return [sheet['properties']['title'] for sheet in result.get('sheets', [])]
+
+    def get_revision(self, spreadsheet_id):
+        """
+        Return a token that changes whenever the spreadsheet is edited.
+
+        Uses the Drive file ``version`` (bumped on every change) together with
+        ``modifiedTime``; a single cheap metadata request.
+        """
+        with self._lock:
+            result = self.drive.files().get(
+                fileId=spreadsheet_id,
+                fields='version,modifiedTime'
+            ).execute()
+        return f"{result.get('version')}@{result.get('modifiedTime')}"
+
+_sheets_client = None
+
+def get_sheets_client():
+    """Return the process-wide Google Sheets client, creating it on first use."""
+    global _sheets_client
+    if _sheets_client is None:
+        _sheets_client = GoogleSheetsClient()
+    return _sheets_client
+
+# Sheets snapshots
+#
+# ``--record`` saves the spreadsheet's revision, tab titles and the raw cell
+# values of every strategy tab to a snapshot directory: a manifest plus one
+# gzipped JSON file per range. ``--replay`` serves them through
+# ``SnapshotSheetsClient``, which answers the same calls as
+# ``GoogleSheetsClient`` (including the row ranges of incremental syncs)
+# without credentials or network access.
+
+def _snapshot_file(range_name):
+    return f"{hashlib.sha1(range_name.encode()).hexdigest()[:16]}.json.gz"
+
+def record_sheets_snapshot(SPREADSHEET_ID, directory):
+    """Save the current contents of every strategy tab to the snapshot in ``directory``."""
+    import gzip
+
+    client = get_sheets_client()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    revision = client.get_revision(SPREADSHEET_ID)
+    titles = client.get_sheet_titles(SPREADSHEET_ID)
+    ranges = [
+        range_name
+        for timeframes in build_strategy_registry(titles).values()
+        for range_name in timeframes.values()
+    ]
+    files = {}
+    for range_name, values in zip(ranges, client.batch_get_values(SPREADSHEET_ID, ranges)):
+        files[range_name] = _snapshot_file(range_name)
+        with gzip.open(directory / files[range_name], 'wt', compresslevel=6) as f:
+            json.dump(values, f, separators=(',', ':'))
+
+    manifest = {
+        'spreadsheet_id': SPREADSHEET_ID,
+        'revision': revision,
+        'recorded': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'titles': titles,
+        'ranges': files,
+    }
+    tmp_path = directory / 'manifest.json.tmp'
+    tmp_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    os.replace(tmp_path, directory / 'manifest.json')
+
+    # Drop the ranges of earlier recordings that are no longer in the spreadsheet
+    for path in directory.glob('*.json.gz'):
+        if path.name not in files.values():
+            path.unlink()
+    logger.info(f"Recorded {len(files)} ranges at revision {revision} to {directory}")
+    return manifest
+
+class SnapshotSheetsClient:
+    """
+    Serves a snapshot saved by ``record_sheets_snapshot`` in place of ``GoogleSheetsClient``.
+
+    A range is answered from the recorded range of the same sheet and
+    columns; row bounds such as ``A1:L1`` or ``A120:L`` select rows of it,
+    like the API would.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / 'manifest.json') as f:
+            self.manifest = json.load(f)
+        self.spreadsheet_id = self.manifest['spreadsheet_id']
+        self.bytes_received = 0
+        self._values = {}
+
+    def _recorded_values(self, sheet_name, first_col, last_col):
+        import gzip
+
+        range_name = f"{sheet_name}!{first_col}:{last_col}"
+        if range_name not in self._values:
+            if range_name not in self.manifest['ranges']:
+                raise KeyError(f"{range_name} is not in the snapshot at {self.directory}")
+            path = self.directory / self.manifest['ranges'][range_name]
+            self.bytes_received += path.stat().st_size
+            with gzip.open(path, 'rt') as f:
+                self._values[range_name] = json.load(f)
+        return self._values[range_name]
+
+    def get_values(self, spreadsheet_id, range_name):
+        """Return the recorded cell values of one range."""
+        sheet_name, first_col, last_col = split_range(range_name)
+        values = self._recorded_values(sheet_name, first_col, last_col)
+        first_row, last_row = re.fullmatch(r'[A-Z]+(\d*):[A-Z]+(\d*)', range_name.rpartition('!')[2]).groups()
+        return values[int(first_row or 1) - 1:int(last_row) if last_row else None]
+
+    def batch_get_values(self, spreadsheet_id, range_names):
+        """Return the recorded cell values of several ranges."""
+        return [self.get_values(spreadsheet_id, range_name) for range_name in range_names]
+
+    def get_sheet_titles(self, spreadsheet_id):
+        """Return the tab titles at the time of recording."""
+        return list(self.manifest['titles'])
+
+    def get_revision(self, spreadsheet_id):
+        """Return the spreadsheet revision the snapshot was recorded at."""
+        return self.manifest['revision']
+
+def use_sheets_snapshot(directory):
+    """Serve every Sheets request of this process from the snapshot in ``directory``."""
+    global _sheets_client, SPREADSHEET_ID
+    _sheets_client = SnapshotSheetsClient(directory)
+    SPREADSHEET_ID = _sheets_client.spreadsheet_id
+    manifest = _sheets_client.manifest
+    logger.info(f"Replaying {len(manifest['ranges'])} ranges recorded {manifest['recorded']} from {directory}")
+    return _sheets_client
+
+# Day zero of Excel's two date systems (1900 is off by two days because of
+# Excel's fictitious 29/02/1900 and its 1-based day numbering)
+EXCEL_EPOCHS = {
+    1900: '1899-12-30T00:00:00',
+    1904: '1904-01-01T00:00:00',
+}
+
+def excel_serials_to_datetime(dates, times=None, epoch=1900):
+    """
+    Convert whole columns of Excel serial dates and times to datetimes.
+
+    ``dates`` holds Excel serial day numbers and ``times`` fractions of a day,
+    either as numbers or numeric strings. Blank times count as midnight.
+    Returns a ``datetime64[ns]`` Series aligned with ``dates``; rows that cannot
+    be converted are NaT and are reported in a single warning.
+    """
+    with measure('date_conversion') as record:
+        record['rows'] = len(dates)
+        return _excel_serials_to_datetime(dates, times, epoch)
+
+def _excel_serials_to_datetime(dates, times=None, epoch=1900):
+    dates = pd.Series(dates)
+    date_num = pd.to_numeric(dates, errors='coerce').to_numpy('float64', copy=True)
+
+    if times is None:
+        time_num = np.zeros(len(dates))
+    else:
+        times = pd.Series(times, index=dates.index)
+        if times.dtype.kind == 'f':
+            # Numeric times: blanks are already NaN
+            time_num = np.nan_to_num(times.to_numpy('float64'), nan=0.0)
+        else:
+            blank = times.isna() | times.eq('')
+            time_num = pd.to_numeric(times.mask(blank, 0), errors='coerce').to_numpy('float64', copy=True)
+
+    # Truncate like int() does: whole days plus whole seconds of the day,
+    # computed in place to keep long columns to a few buffers
+    total = np.trunc(date_num, out=date_num)
+    total *= 86400
+    seconds = time_num * 24
+    seconds *= 3600
+    total += np.trunc(seconds, out=seconds)
+    del seconds
+
+    base = np.datetime64(EXCEL_EPOCHS[epoch], 's')
+    # Seconds from the epoch to the bounds of datetime64[ns]
+    base_seconds = base.astype('int64')
+    lower = -(-pd.Timestamp.min.value // 10**9) - base_seconds
+    upper = pd.Timestamp.max.value // 10**9 - base_seconds
+    invalid = ~np.isfinite(total)
+    invalid |= total < lower
+    invalid |= total > upper
+
+    total[invalid] = 0
+    ticks = total.astype('int64')
+    del total
+    ticks += base_seconds
+    ticks *= 10**9
+    ticks[invalid] = np.iinfo('int64').min  # NaT
+    result = pd.Series(ticks.view('datetime64[ns]'), index=dates.index)
+
+    if invalid.any():
+        bad = dates.index[invalid]
+        samples = [
+            (dates[i], times[i] if times is not None else None)
+            for i in bad[:5]
+        ]
+        logger.warning(
+            f"Could not convert {len(bad)} Excel date/time values, e.g. {samples}"
+        )
+
+    return result
+
+# Trade sheet schema
+#
+# A trade log tab has twelve columns (A:L), of which the statistics and charts
+# need the entry Date and Time (combined into DateTime), Est. Fee and Win Rate.
+# Only those are kept, in compact types, together with the tab's strategy and
+# timeframe as categoricals.
+
+TRADE_SCHEMA = {
+    'DateTime': 'datetime64[ns]',
+    'Est. Fee': 'float32',
+    'Win Rate': 'bool',
+    'Strategy': 'category',
+    'Timeframe': 'category',
+}
+# Bumped whenever TRADE_SCHEMA changes, so cached frames are parsed again
+TRADE_SCHEMA_VERSION = 2
+
+def _sheet_columns(rows, indices):
+    """
+    Object arrays of the cells in columns ``indices``, one per index.
+
+    The API leaves out the trailing blank cells of a row, so short rows are
+    padded with None before the columns are picked out.
+    """
+    width = max(indices) + 1
+    rows = [row if len(row) >= width else row + [None] * (width - len(row)) for row in rows]
+    return [np.array(list(map(operator.itemgetter(index), rows)), dtype=object) for index in indices]
+
+def _numeric_column(cells, dtype='float64'):
+    """Numbers in a column of cells; blank and unparseable cells become NaN."""
+    try:
+        # Fast path: UNFORMATTED_VALUE returns numbers, and None for blanks
+        return np.array(cells, dtype=dtype)
+    except (TypeError, ValueError):
+        # Formatted text such as "$1,234.50" or blank strings
+        text = pd.Series(cells, dtype=object).astype(str)
+        text = text.str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+        return pd.to_numeric(text, errors='coerce').to_numpy(dtype)
+
+def _blank_cells(cells):
+    return pd.isna(cells) | (cells == '')
+
+def parse_sheet_values(values, range_name=None):
+    """
+    Turn the raw cell values of a trade log range into a ``TRADE_SCHEMA`` frame.
+
+    Rows without a Date or Time are dropped; the index keeps the position of
+    each remaining row below the header. ``Strategy`` and ``Timeframe`` are
+    only added when ``range_name`` is a strategy tab.
+    """
+    with measure('parse', range=range_name or '') as record:
+        record['rows'] = max(len(values) - 1, 0) if values else 0
+        return _parse_sheet_values(values, range_name)
+
+def _parse_sheet_values(values, range_name=None):
+    if not values:
+        logger.warning(f"No data found in {range_name}" if range_name else "No data found")
+        return pd.DataFrame()
+
+    try:
+        # The first column of each name: the entry Date and Time come before the exit ones
+        headers = values[0]
+        positions = {}
+        for i, header in enumerate(headers):
+            if header:
+                positions.setdefault(header, i)
+
+        logger.debug(f"Original columns: {headers}")
+        if 'Date' not in positions or 'Time' not in positions:
+            raise ValueError("Date or Time column is missing")
+
+        wanted = [name for name in ('Date', 'Time', 'Est. Fee', 'Win Rate') if name in positions]
+        cells = dict(zip(wanted, _sheet_columns(values[1:], [positions[name] for name in wanted])))
+        keep = ~(_blank_cells(cells['Date']) | _blank_cells(cells['Time']))
+        index = np.flatnonzero(keep)
 
-        # Print column names for debugging
-        print("Original columns:", headers)
-        print("Unique columns:", unique_headers)
-        
-        # Convert to DataFrame with unique column names
-        df = pd.DataFrame(values[1:], columns=unique_headers)
-        
-        # Drop duplicate Date and Time columns
-        columns_to_keep = [col for i, col in enumerate(unique_headers) if i not in columns_to_drop]
-        df = df[columns_to_keep]
-        
-        # Replace empty strings with NaN
-        df = df.replace('', pd.NA)
-        
-        # Drop rows where Date or Time is NaN
-        df = df.dropna(subset=['Date', 'Time'])
-        
-        # Print first few rows for debugging
-        print("\nFirst few rows of data:")
-        print(df[['Date', 'Time']].head())
-        
         # Convert Excel dates to datetime
-        try:
-            # Convert Date and Time columns to proper datetime
-            df['DateTime'] = df.apply(
-                lambda row: excel_number_to_datetime(
-                    row['Date'],
-                    row['Time'] if pd.notna(row['Time']) else 0
-                ),
-                axis=1
-            )
-            
-            # Print converted dates for verification
-            print("\nConverted dates:")
-            print(df[['Date', 'Time', 'DateTime']].head())
-            
-        except Exception as e:
-            print(f"Error during date conversion: {str(e)}")
-            raise
-        
-        # Convert Est. Fee to numeric, removing any currency symbols and commas
-        if 'Est. Fee' in df.columns:
-            df['Est. Fee'] = pd.to_numeric(df['Est. Fee'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
-            # Fill NaN values with 0 for Est. Fee
-            df['Est. Fee'] = df['Est. Fee'].fillna(0)
-        
-        # Ensure DateTime column exists and is not null
-        if 'DateTime' not in df.columns or df['DateTime'].isna().all():
+        date_time = excel_serials_to_datetime(
+            _numeric_column(cells['Date'][keep]),
+            _numeric_column(cells['Time'][keep])
+        )
+        columns = {'DateTime': date_time.to_numpy()}
+
+        # Est. Fee as a number, with missing fees counted as 0
+        if 'Est. Fee' in cells:
+            fees = _numeric_column(cells['Est. Fee'][keep], TRADE_SCHEMA['Est. Fee'])
+            fees[np.isnan(fees)] = 0
+            columns['Est. Fee'] = fees
+
+        # Win Rate as a flag
+        if 'Win Rate' in cells:
+            columns['Win Rate'] = cells['Win Rate'][keep] == 'Yes'
+
+        labels = tab_strategy(range_name.rpartition('!')[0]) if range_name else None
+        if labels is not None:
+            for name, label in zip(('Strategy', 'Timeframe'), labels):
+                columns[name] = pd.Categorical.from_codes(np.zeros(len(index), dtype='int8'), [label])
+
+        df = pd.DataFrame(columns, index=index)
+
+        # Log converted dates for verification
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Converted dates:\n{df[['DateTime']].head()}")
+
+        # Ensure DateTime column is not null
+        if df['DateTime'].isna().all():
             raise ValueError("DateTime column is missing or contains no valid dates")
-        
+
         return df
 
-    except HttpError as err:
-        print(f"An error occurred: {err}")
-        raise
     except Exception as e:
-        print(f"Error processing data: {str(e)}")
-        if 'df' in locals():
-            print("DataFrame columns:", df.columns.tolist())
-            print("\nSample data:")
-            print(df.head())
+        logger.debug(f"Error processing data: {str(e)}")
+        if 'df' in locals() and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"DataFrame columns: {df.columns.tolist()}")
+            logger.debug(f"Sample data:\n{df.head()}")
         raise
 
-def add_utg_logo(fig, position='lower right', ax=None):
-    """Add UTG logo to the figure."""
+def load_data_from_sheets(SPREADSHEET_ID, RANGE_NAME):
+    """Load data from Google Sheets."""
+    from googleapiclient.errors import HttpError
+
+    try:
+        logger.debug(f"Requesting range: {RANGE_NAME}")
+
+        client = get_sheets_client()
+        with measure('fetch', range=RANGE_NAME) as record:
+            received = getattr(client, 'bytes_received', 0)
+            values = client.get_values(SPREADSHEET_ID, RANGE_NAME)
+            record['rows'] = len(values)
+            record['bytes'] = getattr(client, 'bytes_received', 0) - received
+
+    except HttpError as err:
+        logger.error(f"An error occurred: {err}")
+        raise
+
+    return parse_sheet_values(values, RANGE_NAME)
+
+def fetch_sheet_values_batch(SPREADSHEET_ID, RANGE_NAMES):
+    """Fetch the raw cell values of several ranges with one batchGet request."""
+    RANGE_NAMES = list(RANGE_NAMES)
+    if not RANGE_NAMES:
+        return []
+
+    from googleapiclient.errors import HttpError
+
+    try:
+        # One round trip (and one quota unit) for every requested range
+        logger.debug(f"Requesting ranges: {RANGE_NAMES}")
+        
+        client = get_sheets_client()
+        with measure('fetch') as record:
+            received = getattr(client, 'bytes_received', 0)
+            values = client.batch_get_values(SPREADSHEET_ID, RANGE_NAMES)
+            record['rows'] = sum(len(range_values) for range_values in values)
+            record['bytes'] = getattr(client, 'bytes_received', 0) - received
+        return values
+
+    except HttpError as err:
+        logger.error(f"An error occurred: {err}")
+        raise
+
+def load_data_from_sheets_batch(SPREADSHEET_ID, RANGE_NAMES, errors=None):
+    """
+    Load several ranges from Google Sheets with a single batchGet request.
+
+    Returns a dict mapping each range name to its DataFrame. If ``errors`` is
+    a dict, ranges that fail to parse are recorded there and left out of the
+    result instead of aborting the whole batch.
+    """
+    RANGE_NAMES = list(RANGE_NAMES)
+    frames = {}
+    for range_name, values in zip(RANGE_NAMES, fetch_sheet_values_batch(SPREADSHEET_ID, RANGE_NAMES)):
+        try:
+            frames[range_name] = parse_sheet_values(values, range_name)
+        except Exception as e:
+            if errors is None:
+                raise
+            logger.error(f"Error parsing {range_name}: {str(e)}")
+            errors[range_name] = e
+
+    return frames
+
+def split_range(RANGE_NAME):
+    """Split a range like "(+50) ETH 3m!A:L" into (sheet, first column, last column)."""
+    sheet_name, _, cells = RANGE_NAME.rpartition('!')
+    match = re.fullmatch(r'([A-Z]+)\d*:([A-Z]+)\d*', cells)
+    if not sheet_name or not match:
+        raise ValueError(f"Unsupported range for incremental sync: {RANGE_NAME}")
+    return sheet_name, match.group(1), match.group(2)
+
+def _cache_file(kind, SPREADSHEET_ID, RANGE_NAME, suffix='.pkl'):
+    """Path of the local cache file of ``kind`` for one spreadsheet range."""
+    key = hashlib.sha1(f"{SPREADSHEET_ID}!{RANGE_NAME}".encode()).hexdigest()[:16]
+    directory = CACHE_DIR / kind
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{key}{suffix}"
+
+def _load_pickle(path):
+    """Load a pickled cache entry, treating unreadable files as missing."""
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file {path}: {str(e)}")
+        return None
+
+def _save_pickle(path, obj):
+    """Atomically write a pickled cache entry."""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def _undated_tail(header, rows):
+    """Number of rows at the end of ``rows`` still missing their Date or Time."""
+    if 'Date' not in header or 'Time' not in header:
+        return 0
+    columns = (header.index('Date'), header.index('Time'))
+    count = 0
+    for row in reversed(rows):
+        if all(len(row) > i and row[i] not in (None, '') for i in columns):
+            break
+        count += 1
+    return count
+
+def _append_rows(state, new_rows, RANGE_NAME=None):
+    """
+    Parse rows appended below the ingested ones and add them to the state frame.
+
+    Rows at the end that have no Date or Time yet are trades still being
+    filled in. They are not ingested, so the next sync fetches them again,
+    and the number of rows actually ingested is returned.
+    """
+    new_rows = new_rows[:len(new_rows) - _undated_tail(state['header'], new_rows)]
+    if new_rows:
+        # Parse the tail on its own, then shift its index so it lines up with
+        # what a full reload of the same rows would produce
+        tail = parse_sheet_values([state['header']] + new_rows, RANGE_NAME)
+        tail.index = tail.index + state['rows_ingested']
+        state['frame'] = pd.concat([state['frame'], tail]) if len(state['frame']) else tail
+        state['rows_ingested'] += len(new_rows)
+        state['overlap'] = (state['overlap'] + new_rows)[-SYNC_OVERLAP_ROWS:] if SYNC_OVERLAP_ROWS else []
+    # Lets the statistics tell a frame loaded in full again from an appended one
+    state['frame'].attrs['loaded_at'] = state['loaded_at']
+    return len(new_rows)
+
+def sync_data_from_sheets(SPREADSHEET_ID, RANGE_NAMES, errors=None):
+    """
+    Incrementally sync append-only trade logs from Google Sheets.
+
+    For every range the number of rows already ingested is remembered on disk
+    together with the parsed DataFrame. Later runs only fetch the header row
+    plus the rows from ``SYNC_OVERLAP_ROWS`` above the last ingested row
+    downwards, all in one batchGet. If the header or the overlapping rows no
+    longer match what was ingested, earlier rows were edited and the range is
+    reloaded in full. Edits further up are only seen by the full reload every
+    range gets ``SYNC_FULL_INTERVAL`` seconds after its last one. Returns the
+    same dict as ``load_data_from_sheets_batch``.
+    """
+    RANGE_NAMES = list(RANGE_NAMES)
+    states = {}
+    requests = []
+    now = time.time()
+    for range_name in RANGE_NAMES:
+        state = _load_pickle(_cache_file('sync', SPREADSHEET_ID, range_name))
+        if state is None or state.get('schema') != TRADE_SCHEMA_VERSION or not state.get('rows_ingested', 0):
+            continue
+        if SYNC_FULL_INTERVAL and now - state.get('loaded_at', 0) >= SYNC_FULL_INTERVAL:
+            logger.info(f"Last full load of {range_name} is over {SYNC_FULL_INTERVAL}s old, reloading in full")
+            continue
+        sheet_name, first_col, last_col = split_range(range_name)
+        start_row = state['rows_ingested'] + 2 - len(state['overlap'])
+        requests.append(f"{sheet_name}!{first_col}1:{last_col}1")
+        requests.append(f"{sheet_name}!{first_col}{start_row}:{last_col}")
+        states[range_name] = state
+
+    # Fetch headers and tails of every known range in one round trip
+    tails = {}
+    if requests:
+        values = fetch_sheet_values_batch(SPREADSHEET_ID, requests)
+        for i, range_name in enumerate(states):
+            header_rows, tail_rows = values[2 * i], values[2 * i + 1]
+            state = states[range_name]
+            overlap = state['overlap']
+            if header_rows[:1] == [state['header']] and tail_rows[:len(overlap)] == overlap:
+                tails[range_name] = tail_rows[len(overlap):]
+            else:
+                logger.info(f"Earlier rows changed in {range_name}, reloading in full")
+
+    # Anything without a usable state gets a full reload, again in one batchGet
+    reload_names = [name for name in RANGE_NAMES if name not in tails]
+    if reload_names:
+        for range_name, values in zip(reload_names, fetch_sheet_values_batch(SPREADSHEET_ID, reload_names)):
+            states[range_name] = {
+                'schema': TRADE_SCHEMA_VERSION,
+                'header': values[0] if values else [],
+                'rows_ingested': 0,
+                'overlap': [],
+                'frame': pd.DataFrame(),
+                'loaded_at': now,
+            }
+            tails[range_name] = values[1:]
+
+    frames = {}
+    for range_name in RANGE_NAMES:
+        state = states[range_name]
+        new_rows = tails[range_name]
+        try:
+            if not state['header']:
+                logger.warning(f"No data found in {range_name}")
+                frames[range_name] = pd.DataFrame()
+                continue
+            ingested = _append_rows(state, new_rows, range_name)
+            logger.info(f"Synced {range_name}: {ingested} new rows, {state['rows_ingested']} total")
+            if ingested:
+                _save_pickle(_cache_file('sync', SPREADSHEET_ID, range_name), state)
+            frames[range_name] = state['frame']
+        except Exception as e:
+            if errors is None:
+                raise
+            logger.error(f"Error parsing {range_name}: {str(e)}")
+            errors[range_name] = e
+
+    return frames
+
+def get_spreadsheet_revision(SPREADSHEET_ID):
+    """Return the spreadsheet's revision token, or None if it cannot be read."""
+    try:
+        return get_sheets_client().get_revision(SPREADSHEET_ID)
+    except Exception as e:
+        logger.warning(f"Could not read spreadsheet revision, skipping cache: {str(e)}")
+        return None
+
+def _cached_frame(SPREADSHEET_ID, RANGE_NAME, revision):
+    """The frame cached for ``RANGE_NAME`` at ``revision``, or None."""
+    entry = _load_pickle(_cache_file('parsed', SPREADSHEET_ID, RANGE_NAME))
+    if entry is None or entry.get('revision') != revision or entry.get('schema') != TRADE_SCHEMA_VERSION:
+        return None
+    if 'frame' in entry:
+        return entry['frame']
+
+    # Synced incrementally: the frame is the one saved with the sync state
+    state = _load_pickle(_cache_file('sync', SPREADSHEET_ID, RANGE_NAME))
+    if state is None or state.get('schema') != TRADE_SCHEMA_VERSION:
+        return None
+    frame = state['frame']
+    if frame.attrs.get('loaded_at') != entry['loaded_at'] or len(frame) != entry['rows']:
+        return None
+    return frame
+
+def load_trade_data(SPREADSHEET_ID, RANGE_NAMES, errors=None, revision=None):
+    """
+    Load parsed trade frames, reusing the on-disk cache while the sheet is unchanged.
+
+    Parsed frames are cached per spreadsheet and range together with the
+    spreadsheet revision they were read at. If the revision still matches,
+    the frame is read straight from disk and Google Sheets is not queried at
+    all; otherwise the range is fetched according to ``SYNC_MODE``. The
+    revision is looked up unless the caller already has it. Incrementally
+    synced frames are already saved with their sync state, so for those the
+    cache only records which frame the revision belongs to.
+    """
+    RANGE_NAMES = list(RANGE_NAMES)
+    if revision is None:
+        revision = get_spreadsheet_revision(SPREADSHEET_ID)
+
+    frames = {}
+    if revision is not None:
+        for range_name in RANGE_NAMES:
+            frame = _cached_frame(SPREADSHEET_ID, range_name, revision)
+            if frame is not None:
+                frames[range_name] = frame
+        if frames:
+            logger.info(f"Loaded {len(frames)} of {len(RANGE_NAMES)} ranges from cache (revision {revision})")
+
+    missing = [name for name in RANGE_NAMES if name not in frames]
+    if missing:
+        incremental = SYNC_MODE == 'incremental'
+        if incremental:
+            loaded = sync_data_from_sheets(SPREADSHEET_ID, missing, errors=errors)
+        else:
+            loaded = load_data_from_sheets_batch(SPREADSHEET_ID, missing, errors=errors)
+            for df in loaded.values():
+                df.attrs['loaded_at'] = time.time()
+
+        if revision is not None:
+            for range_name, df in loaded.items():
+                entry = {'revision': revision, 'schema': TRADE_SCHEMA_VERSION}
+                if incremental:
+                    entry.update(loaded_at=df.attrs.get('loaded_at'), rows=len(df))
+                else:
+                    entry['frame'] = df
+                _save_pickle(_cache_file('parsed', SPREADSHEET_ID, range_name), entry)
+        frames.update(loaded)
+
+    return {name: frames[name] for name in RANGE_NAMES if name in frames}
+
+# Strategy registry
+#
+# Strategies are discovered from the spreadsheet's tab titles: every tab
+# matching STRATEGY_TAB_PATTERN is one timeframe of the strategy named by its
+# asset and offset, so new tabs are picked up without code changes.
+
+TIMEFRAME_MINUTES = {'m': 1, 'h': 60, 'd': 1440}
+
+def _timeframe_order(timeframe):
+    try:
+        return (int(timeframe[:-1]) * TIMEFRAME_MINUTES[timeframe[-1]], timeframe)
+    except (KeyError, ValueError):
+        return (float('inf'), timeframe)
+
+def tab_strategy(title, pattern=STRATEGY_TAB_PATTERN):
+    """Return ``(strategy, timeframe)`` of a strategy tab title, or None for other tabs."""
+    match = re.match(pattern, title.strip())
+    if match is None:
+        return None
+    return f"{match['asset']} {int(match['offset']):+d}", match['timeframe']
+
+def build_strategy_registry(titles, pattern=STRATEGY_TAB_PATTERN):
+    """
+    Group the tab ``titles`` matching ``pattern`` into strategies.
+
+    Returns ``{strategy: {timeframe: range}}``, for example
+    ``{'ETH +50': {'3m': '(+50) ETH 3m!A:L', '5m': '(+50) ETH 5m!A:L'}}``,
+    with strategies ordered by asset and offset and timeframes by duration.
+    Tabs that do not match are left out.
+    """
+    matcher = re.compile(pattern)
+    found = {}
+    for title in titles:
+        match = matcher.match(title.strip())
+        if match is None:
+            continue
+        strategy = (match['asset'], int(match['offset']))
+        found.setdefault(strategy, {})[match['timeframe']] = f"{title}!{STRATEGY_TAB_COLUMNS}"
+
+    registry = {}
+    for asset, offset in sorted(found):
+        timeframes = found[(asset, offset)]
+        registry[f"{asset} {offset:+d}"] = {
+            timeframe: timeframes[timeframe] for timeframe in sorted(timeframes, key=_timeframe_order)
+        }
+    return registry
+
+def load_strategy_registry(SPREADSHEET_ID, revision=None):
+    """
+    Return the spreadsheet's strategy registry.
+
+    The registry is cached on disk with the spreadsheet revision it was built
+    at, and the tab titles are only read again (one metadata request for all
+    tabs) once the revision changes. If they cannot be read, the last cached
+    registry is used.
+    """
+    path = _cache_file('registry', SPREADSHEET_ID, STRATEGY_TAB_PATTERN)
+    entry = _load_pickle(path)
+    if entry is not None and revision is not None and entry['revision'] == revision:
+        return entry['registry']
+
+    try:
+        titles = get_sheets_client().get_sheet_titles(SPREADSHEET_ID)
+    except Exception as e:
+        if entry is None:
+            raise
+        logger.warning(f"Could not read the spreadsheet's tabs, using the cached strategies: {str(e)}")
+        return entry['registry']
+
+    registry = build_strategy_registry(titles)
+    tab_count = sum(len(timeframes) for timeframes in registry.values())
+    logger.info(f"Found {len(registry)} strategies in {tab_count} of {len(titles)} tabs")
+    if revision is not None:
+        _save_pickle(path, {'revision': revision, 'registry': registry})
+    return registry
+
+# Trade statistics
+#
+# Running aggregates of every range's trades since the report start date.
+# Each run folds in only the rows appended since the previous one. The
+# aggregates are pickled, and the time-sorted trade series is appended to a
+# binary file next to them, so neither is rewritten in full on every run.
+# The series carries running totals of fees and wins, so the totals of any
+# time window are the difference of two binary-searched rows.
+
+# Columns the statistics and charts read; only these go into a chart's cache key
+CHART_DATA_COLUMNS = ['DateTime', 'Est. Fee', 'Win Rate']
+# Each trade's time and fee, with the fee total and win count up to and including it
+TRADE_SERIES_DTYPE = [('time', 'datetime64[ns]'), ('fee', 'float64'), ('cumulative', 'float64'), ('wins', 'int64')]
+# Bumped whenever the persisted statistics change layout, so they are counted again
+TRADE_STATS_VERSION = 3
+
+_trade_stats = {}
+# Held while a range's statistics are updated, so other threads never read them half-updated
+_trade_stats_lock = threading.Lock()
+
+class TradeStats:
+    """
+    Win/loss counts, fee aggregates and the cumulative fee series of one
+    strategy and timeframe, over its trades since ``start_date``.
+
+    ``update`` only processes the frame rows it has not counted yet, so the
+    work per run is proportional to the number of new trades.
+    """
+
+    def __init__(self, start_date):
+        self.start_date = pd.Timestamp(start_date)
+        self.reset()
+
+    def reset(self):
+        """Forget every counted trade."""
+        self.rows = 0
+        self.tail = None
+        self.loaded_at = None
+        self.digest = ''
+        self.trades = 0
+        self.wins = 0
+        self.fee_total = 0.0
+        self.fee_min = np.inf
+        self.fee_max = -np.inf
+        self.length = 0
+        self.persisted = 0
+        self._series = np.empty(0, dtype=TRADE_SERIES_DTYPE)
+
+    def __getstate__(self):
+        # Pickled without the spare capacity of the series
+        state = self.__dict__.copy()
+        state['_series'] = self.series.copy()
+        return state
+
+    def __copy__(self):
+        # Shares the series instead of going through __getstate__, which copies it
+        stats = type(self).__new__(type(self))
+        stats.__dict__.update(self.__dict__)
+        return stats
+
+    def summary(self):
+        """A copy without the fee series, cheap to send to charts that only read the totals."""
+        summary = copy.copy(self)
+        summary._series = self._series[:0]
+        summary.length = 0
+        return summary
+
+    def downsampled(self, buckets=None):
+        """A copy whose series only keeps the vertices of its cumulative fee line, see ``downsample_line``."""
+        series = self.series
+        line = copy.copy(self)
+        line._series = series[downsample_line(series['time'], series['cumulative'], buckets)]
+        line.length = len(line._series)
+        return line
+
+    def since(self, start):
+        """
+        A copy of the trades from ``start`` on, with its own totals and a
+        cumulative fee line starting from zero.
+
+        The copy has its own series, so it stays as it is while this one is
+        updated. Needs the series, so it cannot be used on a ``summary()``.
+        """
+        start = pd.Timestamp(start)
+        series = self.series
+        lo = int(np.searchsorted(series['time'], start.to_datetime64()))
+        part = series[lo:].copy()
+        if lo:
+            part['cumulative'] -= series['cumulative'][lo - 1]
+            part['wins'] -= series['wins'][lo - 1]
+
+        stats = copy.copy(self)
+        stats.start_date = max(start, self.start_date)
+        stats._series = part
+        stats.length = stats.trades = len(part)
+        stats.wins = int(part['wins'][-1]) if len(part) else 0
+        stats.fee_total = float(part['cumulative'][-1]) if len(part) else 0.0
+        counted = part['fee'][~np.isnan(part['fee'])]
+        stats.fee_min = float(counted.min()) if len(counted) else np.inf
+        stats.fee_max = float(counted.max()) if len(counted) else -np.inf
+        return stats
+
+    @property
+    def losses(self):
+        return self.trades - self.wins
+
+    @property
+    def win_rate(self):
+        return (self.wins / self.trades) * 100 if self.trades > 0 else 0
+
+    @property
+    def fee_average(self):
+        return self.fee_total / self.trades if self.trades > 0 else 0
+
+    @property
+    def series(self):
+        """Counted trades sorted by time: ``time``, ``fee`` and ``cumulative`` fee."""
+        return self._series[:self.length]
+
+    @property
+    def fees(self):
+        return self.series['fee']
+
+    def window(self, start=None, end=None):
+        """
+        Totals of the counted trades from ``start`` (inclusive) to ``end`` (exclusive).
+
+        Two binary searches in the time-sorted series and the differences of
+        its running totals, so a window costs the same however many trades it
+        spans. Either bound may be left open. Needs the series, so it cannot
+        be used on a ``summary()``.
+        """
+        series = self.series
+        lo = 0 if start is None else int(np.searchsorted(series['time'], pd.Timestamp(start).to_datetime64()))
+        hi = len(series) if end is None else int(np.searchsorted(series['time'], pd.Timestamp(end).to_datetime64()))
+        hi = max(hi, lo)
+
+        def running(field, i):
+            return series[field][i - 1] if i else 0
+
+        return TradeWindow(
+            start, end, hi - lo,
+            int(running('wins', hi) - running('wins', lo)),
+            float(running('cumulative', hi) - running('cumulative', lo))
+        )
+
+    def update(self, df):
+        """
+        Count the rows of ``df``, the range's whole frame, not counted yet.
+
+        The last ``SYNC_OVERLAP_ROWS`` counted rows are compared with the
+        frame first; if they were edited or removed, or the frame was loaded
+        in full again since (its ``loaded_at`` attribute changed), everything
+        is counted again. Returns the number of rows processed.
+        """
+        columns = [col for col in CHART_DATA_COLUMNS if col in df.columns]
+        loaded_at = df.attrs.get('loaded_at')
+        if self.rows:
+            counted = df.iloc[max(self.rows - SYNC_OVERLAP_ROWS, 0):self.rows][columns]
+            if loaded_at != self.loaded_at:
+                logger.info("Trades were loaded in full again, recounting statistics")
+                self.reset()
+            elif self.rows > len(df) or not counted.reset_index(drop=True).equals(self.tail):
+                logger.info("Earlier trades changed, recounting statistics")
+                self.reset()
+        self.loaded_at = loaded_at
+
+        new_rows = df.iloc[self.rows:]
+        self.rows = len(df)
+        self.tail = df.iloc[max(len(df) - SYNC_OVERLAP_ROWS, 0):][columns].reset_index(drop=True)
+        if 'DateTime' not in df.columns or 'Est. Fee' not in df.columns:
+            return len(new_rows)
+
+        trades = new_rows[new_rows['DateTime'] >= self.start_date]
+        if trades.empty:
+            return len(new_rows)
+
+        times = trades['DateTime'].to_numpy('datetime64[ns]')
+        fees = trades['Est. Fee'].to_numpy('float64')
+        wins = trades['Win Rate'].to_numpy(bool) if 'Win Rate' in trades.columns else np.zeros(len(trades), bool)
+
+        self._extend_series(times, fees, wins)
+        self.trades += len(trades)
+        self.wins += int(wins.sum())
+        self.fee_total += float(np.nansum(fees))
+        if not np.isnan(fees).all():
+            self.fee_min = min(self.fee_min, float(np.nanmin(fees)))
+            self.fee_max = max(self.fee_max, float(np.nanmax(fees)))
+
+        # Chained hash of every batch counted, for the render cache
+        digest = hashlib.sha1(self.digest.encode())
+        for values in (times, fees, wins):
+            digest.update(values.tobytes())
+        self.digest = digest.hexdigest()
+        return len(new_rows)
+
+    def _extend_series(self, times, fees, wins):
+        # 'wins' holds each trade's own win flag until the running count is taken
+        new = np.empty(len(times), dtype=TRADE_SERIES_DTYPE)
+        order = np.argsort(times, kind='stable')
+        new['time'] = times[order]
+        new['fee'] = fees[order]
+        new['wins'] = wins[order]
+
+        if self.length and new['time'][0] < self.series['time'][-1]:
+            # Trades older than ones already counted: re-sort the whole series
+            counted = self.series.copy()
+            counted['wins'] = np.diff(counted['wins'], prepend=0)
+            new = np.concatenate([counted, new])
+            new = new[np.argsort(new['time'], kind='stable')]
+            self.length = self.persisted = 0
+            running_fees, running_wins = 0.0, 0
+        else:
+            running_fees, running_wins = self.fee_total, self.wins
+
+        # Missing fees are skipped, as in fee_total
+        new['cumulative'] = running_fees + np.nancumsum(new['fee'])
+        new['wins'] = running_wins + np.cumsum(new['wins'])
+
+        # Grow geometrically so appending stays proportional to the new trades
+        if self.length + len(new) > len(self._series):
+            grown = np.empty(max(2 * len(self._series), self.length + len(new)), dtype=TRADE_SERIES_DTYPE)
+            grown[:self.length] = self.series
+            self._series = grown
+        self._series[self.length:self.length + len(new)] = new
+        self.length += len(new)
+
+class TradeWindow(collections.namedtuple('TradeWindow', 'start end trades wins fee_total')):
+    """Totals of a strategy's trades within a time window, see ``TradeStats.window``."""
+
+    __slots__ = ()
+
+    @property
+    def losses(self):
+        return self.trades - self.wins
+
+    @property
+    def win_rate(self):
+        return (self.wins / self.trades) * 100 if self.trades > 0 else 0
+
+    @property
+    def fee_average(self):
+        return self.fee_total / self.trades if self.trades > 0 else 0
+
+def _trade_stats_files(SPREADSHEET_ID, RANGE_NAME):
+    return (
+        _cache_file('stats', SPREADSHEET_ID, RANGE_NAME),
+        _cache_file('stats', SPREADSHEET_ID, RANGE_NAME, suffix='.series'),
+    )
+
+def _load_trade_stats(SPREADSHEET_ID, RANGE_NAME):
+    """Restore a range's persisted statistics, or None."""
+    header_path, series_path = _trade_stats_files(SPREADSHEET_ID, RANGE_NAME)
+    state = _load_pickle(header_path)
+    if state is None or state.pop('version', None) != TRADE_STATS_VERSION:
+        return None
+    try:
+        series = np.fromfile(series_path, dtype=TRADE_SERIES_DTYPE, count=state['length'])
+    except (OSError, ValueError):
+        return None
+    if len(series) != state['length']:
+        return None
+
+    stats = TradeStats.__new__(TradeStats)
+    stats.__dict__.update(state, _series=series, persisted=len(series))
+    return stats
+
+def _save_trade_stats(stats, SPREADSHEET_ID, RANGE_NAME):
+    """Append the series records not on disk yet, then save the aggregates."""
+    header_path, series_path = _trade_stats_files(SPREADSHEET_ID, RANGE_NAME)
+    if not series_path.exists():
+        stats.persisted = 0
+    with open(series_path, 'r+b' if stats.persisted else 'wb') as f:
+        f.seek(stats.persisted * np.dtype(TRADE_SERIES_DTYPE).itemsize)
+        f.truncate()
+        stats.series[stats.persisted:].tofile(f)
+    stats.persisted = stats.length
+
+    state = {name: value for name, value in stats.__dict__.items() if name not in ('_series', 'persisted')}
+    state['version'] = TRADE_STATS_VERSION
+    _save_pickle(header_path, state)
+
+def load_trade_stats(SPREADSHEET_ID, frames, start_date):
+    """
+    Bring the statistics of every range in ``frames`` up to date and return them.
+
+    Statistics stay in memory between daemon runs and are persisted under
+    ``CACHE_DIR``, so a new process carries on from the previous run.
+    """
+    start_date = pd.Timestamp(start_date)
+    result = {}
+    for range_name, df in frames.items():
+        with measure('statistics', range=range_name) as record, _trade_stats_lock:
+            key = (SPREADSHEET_ID, range_name)
+            stats = _trade_stats.get(key) or _load_trade_stats(SPREADSHEET_ID, range_name)
+            if stats is None or stats.start_date != start_date:
+                stats = TradeStats(start_date)
+
+            record['rows'] = stats.update(df)
+            if record['rows']:
+                try:
+                    _save_trade_stats(stats, SPREADSHEET_ID, range_name)
+                except Exception as e:
+                    logger.warning(f"Could not save statistics of {range_name}: {str(e)}")
+
+            _trade_stats[key] = result[range_name] = stats
+    return result
+
+def report_windows(text=None):
+    """``(label, minutes)`` of each look-back window in ``REPORT_WINDOWS``."""
+    windows = []
+    for label in (text if text is not None else REPORT_WINDOWS).split(','):
+        label = label.strip()
+        if not label:
+            continue
+        minutes, _ = _timeframe_order(label)
+        if minutes == float('inf') or minutes <= 0:
+            raise ValueError(f"{label!r} is not a window like '7d', '12h' or '90m'")
+        windows.append((label, minutes))
+    return windows
+
+def window_report(strategy_stats, windows, end, max_length=4096):
+    """
+    Messages with the fees, trades and win rate of every ``{label: TradeStats}``
+    over each ``(label, minutes)`` look-back window ending at ``end``.
+
+    Strategies are never split between messages, which stay within Telegram's
+    ``max_length``.
+    """
+    end = pd.Timestamp(end)
+    blocks = []
+    for label, stats in strategy_stats.items():
+        lines = [label]
+        for window_label, minutes in windows:
+            window = stats.window(end - pd.Timedelta(minutes=minutes), end)
+            lines.append(
+                f"  {window_label}: ${window.fee_total:,.2f} · {window.trades} trades · "
+                f"{window.win_rate:.1f}% won"
+            )
+        blocks.append('\n'.join(lines))
+
+    messages = [f"🗓 Fees by look-back window (until {end.strftime('%d/%m/%Y %H:%M')})"]
+    for block in blocks:
+        if len(messages[-1]) + len(block) + 2 > max_length:
+            messages.append(block)
+        else:
+            messages[-1] += '\n\n' + block
+    return messages
+
+# Logo box of each position, in figure fractions: (left, bottom, width, height)
+LOGO_POSITIONS = {
+    'lower right': (0.85, 0.02, 0.1, 0.1),
+    'upper right': (0.85, 0.88, 0.1, 0.1),
+    'bar chart': (0.85, 0.78, 0.1, 0.1),
+    'center': (0.45, 0.45, 0.1, 0.1),
+}
+
+LOGO_ASPECT = 16 / 9  # Width / height of the logo image
+
+@functools.lru_cache(maxsize=None)
+def _load_logo(path):
+    """Decode the logo image once per process."""
+    from PIL import Image
+    with Image.open(path) as image:
+        return image.convert('RGBA')
+
+@functools.lru_cache(maxsize=None)
+def _scaled_logo(path, box_width, box_height):
+    """The logo resampled once to fit a ``box_width`` x ``box_height`` pixel box."""
+    from PIL import Image
+    logo = _load_logo(path)
+    scale = min(box_width / logo.width, box_height / logo.height)
+    size = (max(round(logo.width * scale), 1), max(round(logo.height * scale), 1))
+    return np.asarray(logo.resize(size, Image.LANCZOS))
+
+def add_utg_logo(fig, position='lower right', ax=None, dpi=300):
+    """
+    Add UTG logo to the figure.
+
+    The logo goes in the box ``LOGO_POSITIONS[position]``, or in ``position``
+    itself when it is a (left, bottom, width, height) box such as
+    ``ChartLayout.logo_box`` (figure fractions, independent of any axes'
+    data limits). It is drawn straight onto the figure, without axes of its
+    own, from a copy decoded and pre-scaled once per process to the box's
+    pixel size at the output ``dpi``, so saving does not resample the
+    full-resolution image again.
+    Returns the logo image, or None if it could not be added.
+    """
     try:
         # Check if logo file exists
         if not os.path.exists(LOGO_PATH):
             logger.warning(f"Logo file not found at {LOGO_PATH}")
             return
             
-        # Load and add the logo
-        logo = plt.imread(LOGO_PATH)
-        
-        # Create a new axes for the logo
-        if position == 'lower right':
-            logo_ax = fig.add_axes([0.85, 0.02, 0.1, 0.1])
-        elif position == 'upper right':
-            logo_ax = fig.add_axes([0.85, 0.88, 0.1, 0.1])
-        elif position == 'bar chart':
-            y_min, y_max = ax.get_ylim()
-            total_height = y_max - y_min
-            y_pos = 650 / total_height
-            logo_ax = fig.add_axes([0.85, y_pos, 0.1, 0.1])
-        elif position == 'center':
-            logo_ax = fig.add_axes([0.45, 0.45, 0.1, 0.1])
-            
-        # Display the logo
-        logo_ax.imshow(logo)
-        logo_ax.axis('off')
+        # Display the logo above the panels
+        image = fig.figimage(np.zeros((1, 1, 4)), origin='upper', zorder=3)
+        image.logo_box = LOGO_POSITIONS.get(position, position)
+        fit_logo(image, dpi)
+        return image
         
     except Exception as e:
         logger.error(f"Error adding logo: {str(e)}")
 
-def create_win_rate_chart(df, title):
-    # Calculate win rate statistics
-    total_trades = len(df)
-    winning_trades = len(df[df['Win Rate'] == 'Yes'])
-    losing_trades = total_trades - winning_trades
-    win_rate = (winning_trades / total_trades) * 100
-    
-    # Create figure with dark background
-    plt.style.use('dark_background')
-    fig = plt.figure(figsize=(12, 7))
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Add padding at the top for title
-    gs = fig.add_gridspec(2, 2, height_ratios=[0.15, 1], width_ratios=[2, 1], wspace=0.1, hspace=0)
-    
-    # Create title subplot
-    ax_title = fig.add_subplot(gs[0, :])
-    ax_title.axis('off')
-    ax_title.set_facecolor('#000000FA')  # 98% opaque black
-    ax_title.text(
-        0.5, 0.2,
-        f'{title} - Trading Statistics',
-        ha='center',
-        va='center',
-        fontsize=14,
-        fontweight='bold',
-        color='white'
-    )
-    
-    # Create main pie chart subplot
-    ax_pie = fig.add_subplot(gs[1, 0])
-    ax_pie.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Create info subplot for statistics
-    ax_info = fig.add_subplot(gs[1, 1])
-    ax_info.set_facecolor('#000000FA')  # 98% opaque black
-    ax_info.axis('off')
-    
-    # Define colors and style
-    colors = ['#00B800', '#FF0000']  # Softer green and red for trading
-    
-    # Create pie chart with enhanced styling
-    wedges, texts, autotexts = ax_pie.pie(
-        x=[winning_trades, losing_trades],
-        colors=colors,
-        autopct='%1.1f%%',
-        startangle=90,
-        labels=['', ''],
-        pctdistance=0.75,
-        wedgeprops=dict(width=0.7, edgecolor='none', linewidth=0)
-    )
-    
-    # Customize percentage labels
-    plt.setp(autotexts, size=11, weight="bold", color="white")
-    
-    # Add center text showing total trades
-    center_text = f'Total Trades\n{total_trades}'
-    ax_pie.text(0, 0, center_text,
-        ha='center', va='center',
-        fontsize=12, fontweight='bold',
-        color='white'
-    )
-    
-    # Add statistics in the info subplot
-    info_text = (
-        f"Trading Performance\n"
-        f"━━━━━━━━━━━━━━━━━\n\n"
-        f"Win Rate: {win_rate:.1f}%\n\n"
-        f"Winning Trades: {winning_trades}\n"
-        f"Losing Trades: {losing_trades}\n"
-        f"Total Trades: {total_trades}"
-    )
-    
-    ax_info.text(
-        0, 0.5, info_text,
-        ha='left', va='center',
-        fontsize=11,
-        fontfamily='monospace',
-        linespacing=2,
-        color='white'
+def fit_logo(image, dpi):
+    """
+    Give a logo added by ``add_utg_logo`` the copy pre-scaled for saving at
+    ``dpi``, centred in its ``logo_box``.
+    """
+    left, bottom, width, height = image.logo_box
+    fig_width, fig_height = image.figure.get_size_inches() * dpi
+    logo = _scaled_logo(LOGO_PATH, round(width * fig_width), round(height * fig_height))
+    image.set_data(logo)
+    # Figure images are placed in pixels of the saved image
+    image.ox = left * fig_width + (width * fig_width - logo.shape[1]) / 2
+    image.oy = bottom * fig_height + (height * fig_height - logo.shape[0]) / 2
+
+# Fee distributions
+FEE_BIN_WIDTH = 2  # US$ per histogram bar
+FEE_HISTOGRAM_COLOR = '#00B800'  # Softer green for positive fees
+FEE_DENSITY_COLOR = '#FFD700'  # Gold
+# Fee distributions kept per process, keyed by the hash of their data
+FEE_DISTRIBUTIONS_KEPT = 32
+
+_fee_distributions = {}
+
+def _binned_kde(values, bandwidth, grid):
+    """
+    Gaussian KDE of ``values`` evaluated at the evenly spaced points ``grid``.
+
+    The values are linearly binned onto the grid and the bin counts convolved
+    with the kernel by FFT, so the cost is O(n + g log g) rather than O(n * g).
+    """
+    step = grid[1] - grid[0]
+    position = np.clip((values - grid[0]) / step, 0, len(grid) - 1)
+    lower = np.minimum(position.astype(np.int64), len(grid) - 2)
+    upper_share = position - lower
+    counts = (
+        np.bincount(lower, weights=1 - upper_share, minlength=len(grid))
+        + np.bincount(lower + 1, weights=upper_share, minlength=len(grid))
     )
-    
-    # Before saving, add the logo
-    add_utg_logo(fig, 'lower right')
-    
-    # Save the chart
-    filename = f'win_rate_{title.replace(" ", "_").replace("(", "").replace(")", "")}.png'
-    plt.savefig(
-        filename,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
+
+    reach = min(len(grid) - 1, int(np.ceil(5 * bandwidth / step)))
+    offsets = np.arange(-reach, reach + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+
+    size = 1 << int(np.ceil(np.log2(len(grid) + len(kernel))))
+    density = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    return np.clip(density[reach:reach + len(grid)], 0, None) / len(values)
+
+def fee_distribution(fees, bin_width=FEE_BIN_WIDTH, gridsize=200, cut=3):
+    """
+    Histogram and KDE of a fee column, from a single binning pass over the data.
+
+    Returns a dict with the bin ``edges`` and ``counts``, the fee ``bounds``
+    (rounded outwards to whole dollars), the ``mean`` fee and two
+    (support, values) curves: ``kde``, the density over the data range
+    scaled to the histogram counts, and ``density``, the plain density
+    extending ``cut`` bandwidths past the data. The curves are None when the
+    fees have no spread, and the whole result is None when there are no
+    fees. Results are cached by the hash of the data, so charts of an
+    unchanged data set reuse them.
+    """
+    values = np.asarray(fees, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+    key = (hashlib.sha1(values.tobytes()).hexdigest(), bin_width, gridsize, cut)
+    distribution = _fee_distributions.get(key)
+    if distribution is not None:
+        return distribution
+
+    # Bins at bin_width intervals from the floor to the ceiling of the fees
+    min_fee = np.floor(values.min())
+    max_fee = np.ceil(values.max())
+    edges = np.arange(min_fee, max_fee + bin_width, bin_width)
+    if len(edges) < 2:
+        edges = np.array([min_fee, min_fee + bin_width])
+    counts, _ = np.histogram(values, bins=edges)
+
+    distribution = {
+        'edges': edges,
+        'counts': counts,
+        'bounds': (min_fee, max_fee),
+        'mean': values.mean(),
+        'kde': None,
+        'density': None,
+    }
+
+    # Scott's rule bandwidth
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5) if len(values) > 1 else 0
+    if bandwidth > 0:
+        low, high = values.min() - cut * bandwidth, values.max() + cut * bandwidth
+        grid = np.linspace(low, high, 2048)
+        density = _binned_kde(values, bandwidth, grid)
+
+        support = np.linspace(low, high, gridsize)
+        distribution['density'] = (support, np.interp(support, grid, density))
+        support = np.linspace(values.min(), values.max(), gridsize)
+        scale = (counts * np.diff(edges)).sum()
+        distribution['kde'] = (support, np.interp(support, grid, density) * scale)
+
+    if len(_fee_distributions) >= FEE_DISTRIBUTIONS_KEPT:
+        _fee_distributions.pop(next(iter(_fee_distributions)))
+    _fee_distributions[key] = distribution
+    return distribution
+
+# Chart templates
+#
+# Each chart type keeps one figure per process (so one per render worker),
+# laid out on first use. Later renders only update the data artists. The
+# figures are not registered with pyplot, so plt.close('all') leaves them be.
+#
+# The static layers (background, panel frames, logo) are drawn again on every
+# render rather than cached and blitted. Now that the geometry is fixed that
+# would be possible, but they take 12-17 ms of a 50-150 ms draw at 1280px:
+# the rest is ticks, grid lines, labels and titles, which follow each chart's
+# data. Blitting would also mean replaying what Axes.draw does before drawing
+# its children (aspect, title placement) for every panel.
+
+CHART_BACKGROUND = '#000000FA'  # 98% opaque black
+CHART_BORDER = '#404040'
+# Timeframe panels per row; strategies with more timeframes wrap onto further rows
+CHART_PANEL_COLUMNS = 2
+# Strategies per comparison chart; more are split over several charts, so the
+# bars keep their width however many tabs the spreadsheet has
+CHART_COMPARISON_PAGE_SIZE = 30
+# Columns a line chart's time axis is split into for downsampling; each keeps
+# at most four vertices, so a line has at most 4x this many however long it is
+CHART_LINE_BUCKETS = 1000
+
+def chart_suffix(profile=None):
+    """File suffix of charts saved with ``profile`` (default: ``RENDER_PROFILE``)."""
+    image_format = RENDER_PROFILES[profile or RENDER_PROFILE]['format']
+    return '.' + {'JPEG': 'jpg'}.get(image_format, image_format.lower())
+
+def chart_filename(prefix, title_prefix, directory=''):
+    """Output filename of a chart for ``title_prefix``, in ``directory`` (default: the working directory)."""
+    return os.path.join(
+        directory,
+        f'{prefix}_{title_prefix.replace(" ", "_").replace("(", "").replace(")", "")}{chart_suffix()}'
     )
-    plt.close()
+
+def profile_dpi(fig, profile=None):
+    """Resolution at which ``fig`` comes out at the pixel size of ``profile``."""
+    settings = RENDER_PROFILES[profile or RENDER_PROFILE]
+    return settings['dpi'] if 'dpi' in settings else settings['width'] / fig.get_figwidth()
+
+def save_figure(fig, filename, profile=None):
+    """
+    Save ``fig`` to ``filename`` at the size and in the encoding of ``profile``.
+
+    The figure is drawn on its Agg canvas at the profile's resolution, and
+    PIL converts the canvas's pixels (to a palette, or flattened for JPEG)
+    and encodes them with the profile's encoder options.
+    """
+    with measure('save', file=os.path.basename(filename)) as record:
+        _save_figure(fig, filename, profile)
+        record['file_bytes'] = os.path.getsize(filename)
     return filename
 
-def create_fee_distribution_chart(df, title):
-    # Set the style
-    plt.style.use('dark_background')
-    
-    # Create figure and axis with dark background
-    fig, ax = plt.subplots(figsize=(12, 6))
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    ax.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Calculate bin edges at $2 intervals
-    min_fee = np.floor(df['Est. Fee'].min())
-    max_fee = np.ceil(df['Est. Fee'].max())
-    bins = np.arange(min_fee, max_fee + 2, 2)  # $2 intervals
-    
-    # Create the histogram with custom colors and style
-    sns.histplot(
-        data=df,
-        x='Est. Fee',
-        bins=bins,
-        kde=True,
-        ax=ax,
-        color='#00B800',  # Softer green for positive fees
-        edgecolor='#404040',
-        alpha=0.7
-    )
-    
-    # Add KDE line with custom style
-    kde = sns.kdeplot(data=df, x='Est. Fee', ax=ax, color='#FFD700', linewidth=2, alpha=0.7)  # Gold
-    
-    # Calculate average fee
-    avg_fee = df['Est. Fee'].mean()
-    
-    # Add vertical line for average fee
-    ax.axvline(x=avg_fee, color='#00FFFF', linestyle='--', linewidth=2, alpha=0.7)  # Cyan
-    
-    # Add average fee annotation with dark background
-    bbox_props = dict(boxstyle='round,pad=0.5', facecolor='#000000FA', edgecolor='#404040', alpha=0.98)
-    ax.annotate(
-        f'Avg Fee: ${avg_fee:.2f}',
-        xy=(avg_fee, ax.get_ylim()[1] * 0.7),
-        xytext=(avg_fee + 1, ax.get_ylim()[1] * 0.8),
-        bbox=bbox_props,
-        color='white',
-        arrowprops=dict(
-            facecolor='#00FFFF',
-            shrink=0.05,
-            width=2,
-            headwidth=8,
-            headlength=10,
-            alpha=0.7
-        ),
-        fontsize=10,
-        fontweight='bold'
-    )
-    
-    # Add total trades count in top right
-    total_trades = len(df)
-    ax.text(
-        0.95, 0.95,
-        f'Total Trades: {total_trades}',
-        transform=ax.transAxes,
-        ha='right',
-        va='top',
-        fontsize=10,
-        fontweight='bold',
-        color='white'
-    )
-    
-    # Customize the plot
-    ax.set_title(f'{title} - Fee Distribution', pad=20, fontsize=12, fontweight='bold', color='white')
-    ax.set_xlabel('Estimated Fee (US$)', fontsize=10, color='white')
-    ax.set_ylabel('Frequency', fontsize=10, color='white')
-    
-    # Set x-axis ticks at $2 intervals with better formatting
-    xticks = np.arange(min_fee, max_fee + 2, 2)
-    plt.xticks(xticks, [f'${x:g}' for x in xticks], rotation=0, color='white')
-    
-    # Set reasonable x-axis limits
-    ax.set_xlim(min_fee - 0.5, min(max_fee + 0.5, 30))
-    
-    # Customize grid
-    ax.grid(True, linestyle='--', alpha=0.1, color='white')
-    
-    # Add a note if there are fees beyond the visible range
-    if max_fee > 30:
-        ax.text(
-            0.95, 0.85,
-            f'Note: Some fees extend beyond ${30:g}',
-            transform=ax.transAxes,
-            ha='right',
-            va='top',
-            fontsize=8,
-            fontstyle='italic',
-            color='white'
-        )
-    
-    # Set spine colors
-    for spine in ax.spines.values():
-        spine.set_color('#404040')
-    
-    # Adjust layout to prevent label cutoff
-    plt.tight_layout()
-    
-    # Before saving, add the logo
-    add_utg_logo(fig, 'upper right')
-    
-    # Save the chart
-    filename = f'fee_distribution_{title.replace(" ", "_").replace("(", "").replace(")", "")}.png'
-    plt.savefig(
-        filename,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
-    )
-    plt.close()
+def _save_figure(fig, filename, profile=None):
+    from PIL import Image
+
+    encoder_options = dict(RENDER_PROFILES[profile or RENDER_PROFILE])
+    encoder_options.pop('width', None)
+    encoder_options.pop('dpi', None)
+    image_format = encoder_options.pop('format')
+    colors = encoder_options.pop('colors', None)
+
+    # Take the pixels straight from the canvas rather than through savefig,
+    # which would encode them to PNG only for PIL to decode them again
+    fig.set_dpi(profile_dpi(fig, profile))
+    fig.canvas.draw()
+    image = Image.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+
+    if image_format == 'JPEG':
+        # JPEG has no alpha channel: composite onto the chart's black background
+        background = Image.new('RGB', image.size, (0, 0, 0))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif colors:
+        image = image.quantize(colors, method=Image.FASTOCTREE)
+
+    image.save(filename, image_format, **encoder_options)
     return filename
 
-def create_combined_win_rate_chart(df_3m, df_5m, title_prefix):
-    """Create a combined win rate chart for 3m and 5m data."""
-    # Create figure with dark background
-    plt.style.use('dark_background')
-    fig = plt.figure(figsize=(15, 8))
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Create two subplots side by side
-    gs = fig.add_gridspec(2, 2, height_ratios=[0.15, 1], width_ratios=[1, 1], wspace=0.2, hspace=0)
-    
-    # Create title
-    ax_title = fig.add_subplot(gs[0, :])
-    ax_title.axis('off')
-    ax_title.set_facecolor('#000000FA')  # 98% opaque black
-    ax_title.text(
-        0.5, 0.2,
-        f'{title_prefix} - Trading Statistics Comparison',
-        ha='center',
-        va='center',
-        fontsize=16,
-        fontweight='bold',
-        color='white'
-    )
-    
-    # Create subplots for 3m and 5m
-    for i, (df, timeframe) in enumerate([(df_3m, '3m'), (df_5m, '5m')]):
-        # Calculate statistics
-        total_trades = len(df)
-        
-        # Check if Win Rate column exists and handle missing data
-        if 'Win Rate' in df.columns:
-            winning_trades = len(df[df['Win Rate'] == 'Yes'])
-        else:
-            print(f"Win Rate column not found in {timeframe} data")
-            winning_trades = 0
-            
-        losing_trades = total_trades - winning_trades
-        win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
-        
-        # Skip empty dataframes
-        if total_trades == 0:
-            print(f"No data available for {timeframe}")
-            continue
-        
-        # Create pie chart subplot
-        ax_pie = fig.add_subplot(gs[1, i])
-        ax_pie.set_facecolor('#000000FA')  # 98% opaque black
-        
-        # Add timeframe title
-        ax_pie.text(
-            0.5, 1.1,
-            f'{timeframe} Trading Performance',
+# Chart layout
+#
+# The chart templates have a fixed structure, so their geometry is set out
+# in inches: a grid of equal panels within fixed margins, a title band above
+# them and a logo box anchored to a corner. Each figure is sized to its
+# layout and saved as is, without the text-extent passes of tight_layout and
+# bbox_inches='tight' on every save. The margins leave room for the widest
+# tick labels the charts get.
+
+class ChartLayout(collections.namedtuple('ChartLayout', 'grid panel margins spacing title logo')):
+    """
+    Geometry of a chart, in inches.
+
+    ``grid`` is the rows and columns of panels, each ``panel`` (width,
+    height) in size and ``spacing`` (horizontal, vertical) apart, with
+    ``margins`` (left, right, bottom, top) around them. ``title`` is how far
+    below the top edge the figure title is anchored (None for charts titled
+    by their axes) and ``logo`` is the logo's (corner, height, horizontal
+    inset, vertical inset), with the corner 'lower right' or 'upper right'.
+    """
+
+    __slots__ = ()
+
+    @property
+    def figsize(self):
+        (rows, columns), (width, height) = self.grid, self.panel
+        left, right, bottom, top = self.margins
+        return (
+            left + columns * width + (columns - 1) * self.spacing[0] + right,
+            bottom + rows * height + (rows - 1) * self.spacing[1] + top,
+        )
+
+    def panel_boxes(self):
+        """Figure-fraction (left, bottom, width, height) of each panel, row by row from the top."""
+        (rows, columns), (width, height) = self.grid, self.panel
+        fig_width, fig_height = self.figsize
+        left, top = self.margins[0], self.margins[3]
+        return [
+            (
+                (left + column * (width + self.spacing[0])) / fig_width,
+                1 - (top + row * (height + self.spacing[1]) + height) / fig_height,
+                width / fig_width,
+                height / fig_height,
+            )
+            for row in range(rows)
+            for column in range(columns)
+        ]
+
+    @property
+    def title_position(self):
+        """Figure-fraction anchor of the title, centred over the panels."""
+        fig_width, fig_height = self.figsize
+        left, right = self.margins[:2]
+        return ((left + (fig_width - left - right) / 2) / fig_width, 1 - self.title / fig_height)
+
+    @property
+    def logo_box(self):
+        """Figure-fraction (left, bottom, width, height) of the logo."""
+        corner, height, inset_x, inset_y = self.logo
+        width = height * LOGO_ASPECT
+        fig_width, fig_height = self.figsize
+        bottom = inset_y if corner == 'lower right' else fig_height - inset_y - height
+        return ((fig_width - inset_x - width) / fig_width, bottom / fig_height, width / fig_width, height / fig_height)
+
+class ChartTemplate:
+    """
+    A figure that is laid out once and re-rendered by updating its data artists.
+
+    Subclasses give the chart's ``ChartLayout`` in ``layout``, create the
+    static layers (background, axes, fixed labels, logo) in ``build`` and
+    set the data-dependent artists in ``update``.
+    """
+
+    def __init__(self, timeframes=()):
+        self.timeframes = timeframes
+        self.fig = None
+        self.axes = []
+        self.title = None
+        self.logo = None
+        self.current_layout = None
+        self.lock = threading.Lock()
+
+    @property
+    def grid_shape(self):
+        """Rows and columns of the timeframe panels."""
+        columns = max(1, min(len(self.timeframes), CHART_PANEL_COLUMNS))
+        return -(-len(self.timeframes) // columns), columns
+
+    def layout(self, *args):
+        """The ``ChartLayout`` of the chart of ``args``."""
+        raise NotImplementedError
+
+    def build(self, fig, layout):
+        raise NotImplementedError
+
+    def update(self, *args):
+        raise NotImplementedError
+
+    @staticmethod
+    def empty_label(ax, timeframe):
+        """
+        A hidden label over ``ax`` that stands in for the panel of a timeframe without trades.
+
+        It is a figure text placed in the panel's axes coordinates, so it
+        stays visible when the panel is hidden and follows it when moved.
+        """
+        return ax.figure.text(
+            0.5, 0.5,
+            f'{timeframe}\nNo trades',
+            transform=ax.transAxes,
             ha='center',
-            va='bottom',
+            va='center',
             fontsize=14,
             fontweight='bold',
             color='white',
-            transform=ax_pie.transAxes
+            visible=False
         )
-        
-        # Define colors
-        colors = ['#00B800', '#FF0000']  # Softer green and red for trading
-        
-        # Create pie chart
-        wedges, texts, autotexts = ax_pie.pie(
-            x=[winning_trades, losing_trades],
-            colors=colors,
-            autopct='%1.1f%%',
-            startangle=90,
-            labels=['Win', 'Loss'],
-            pctdistance=0.75,
-            wedgeprops=dict(width=0.7, edgecolor='none', linewidth=0),
-            textprops={'fontsize': 12, 'fontweight': 'bold', 'color': 'white'}
+
+    def place(self, layout):
+        """Resize the figure to ``layout`` and move the panels, title and logo into it."""
+        self.fig.set_size_inches(layout.figsize)
+        for ax, box in zip(self.axes, layout.panel_boxes()):
+            ax.set_position(box)
+        if layout.title is not None:
+            self.title.set_position(layout.title_position)
+        if self.logo is not None:
+            self.logo.logo_box = layout.logo_box
+        self.current_layout = layout
+
+    def render(self, filename, *args):
+        """Update the figure with ``args`` and save it to ``filename`` in ``RENDER_PROFILE``."""
+        plt = _pyplot()
+        layout = self.layout(*args)
+        with self.lock, plt.style.context('dark_background'):
+            if self.fig is None:
+                from matplotlib.backends.backend_agg import FigureCanvasAgg
+                from matplotlib.figure import Figure
+
+                fig = Figure(figsize=layout.figsize)
+                FigureCanvasAgg(fig)
+                # The panels are transparent and show the figure's background
+                fig.patch.set_facecolor(CHART_BACKGROUND)
+                fig.patch.set_edgecolor('none')
+                self.build(fig, layout)
+                self.fig = fig
+                self.current_layout = layout
+            elif layout != self.current_layout:
+                self.place(layout)
+
+            self.update(*args)
+            if self.logo is not None:
+                fit_logo(self.logo, profile_dpi(self.fig))
+            save_figure(self.fig, filename)
+        return filename
+
+_chart_templates = {}
+
+def get_chart_template(template_class, timeframes=()):
+    """Return this process's ``template_class`` figure, creating it on first use."""
+    key = (template_class, tuple(timeframes))
+    if key not in _chart_templates:
+        _chart_templates.setdefault(key, template_class(tuple(timeframes)))
+    return _chart_templates[key]
+
+class WinRateTemplate(ChartTemplate):
+    """Win/loss donut charts, one panel per timeframe."""
+
+    colors = ['#00B800', '#FF0000']  # Softer green and red for trading
+
+    def layout(self, *args):
+        rows, columns = self.grid_shape
+        return ChartLayout(
+            grid=(rows, columns),
+            panel=(5.3, 5.3),
+            margins=(0.25, 0.7, 0.85, 0.92),
+            spacing=(1.06, 1.68),
+            title=0.74,  # Below the panel titles
+            logo=('lower right', 0.42 * columns, 0.1, 0.1),
         )
-        
-        # Customize percentage labels
-        plt.setp(autotexts, size=12, weight="bold", color="white")
-        
-        # Add center text without box
-        center_text = f'Total\nTrades\n{total_trades}'
-        ax_pie.text(0, 0, center_text,
+
+    def build(self, fig, layout):
+        self.title = fig.text(
+            *layout.title_position, '',
             ha='center',
             va='center',
-            fontsize=13,
+            fontsize=16,
             fontweight='bold',
             color='white'
         )
-        
-        # Add statistics in a box
-        stats_text = (
-            f"Win Rate: {win_rate:.1f}%\n"
-            f"Winning Trades: {winning_trades}\n"
-            f"Losing Trades: {losing_trades}"
-        )
-        
-        # Create a box with statistics
-        bbox_props = dict(
-            boxstyle='round,pad=0.8',
-            facecolor='#000000FA',  # 98% opaque black
-            edgecolor='#404040',
-            alpha=0.98
-        )
-        
-        ax_pie.text(
-            0.98, 0.02,
-            stats_text,
-            ha='right',
-            va='bottom',
-            fontsize=12,
-            fontweight='bold',
-            color='white',
-            transform=ax_pie.transAxes,
-            bbox=bbox_props,
-            linespacing=1.5
-        )
-    
-    # Before saving, add the logo
-    add_utg_logo(fig, 'lower right')
-    
-    # Save the chart
-    filename = f'win_rate_comparison_{title_prefix.replace(" ", "_").replace("(", "").replace(")", "")}.png'
-    plt.savefig(
-        filename,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
-    )
-    plt.close()
-    return filename
 
-def create_combined_fee_distribution_chart(df_3m, df_5m, title_prefix):
-    """Create a combined fee distribution chart for 3m and 5m data."""
-    # Set the style
-    plt.style.use('dark_background')
-    
-    # Create figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    ax1.set_facecolor('#000000FA')  # 98% opaque black
-    ax2.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Set title
-    fig.suptitle(f'{title_prefix} - Fee Distribution Comparison', 
-                 fontsize=16, fontweight='bold', y=1.02, color='white')
-    
-    # Process both timeframes
-    for ax, df, timeframe in [(ax1, df_3m, '3m'), (ax2, df_5m, '5m')]:
-        # Calculate bin edges
-        min_fee = np.floor(df['Est. Fee'].min())
-        max_fee = np.ceil(df['Est. Fee'].max())
-        bins = np.arange(min_fee, max_fee + 2, 2)
-        
-        # Create histogram
-        sns.histplot(
-            data=df,
-            x='Est. Fee',
-            bins=bins,
-            kde=True,
-            ax=ax,
-            color='#00B800',  # Softer green for positive fees
-            edgecolor='#404040',
-            alpha=0.7
-        )
-        
-        # Add KDE line
-        sns.kdeplot(data=df, x='Est. Fee', ax=ax, color='#FFD700', linewidth=2, alpha=0.7)  # Gold
-        
-        # Calculate and add average fee
-        avg_fee = df['Est. Fee'].mean()
-        ax.axvline(x=avg_fee, color='#00FFFF', linestyle='--', linewidth=2, alpha=0.7)  # Cyan
-        
-        # Add average fee annotation with arrow
-        y_max = ax.get_ylim()[1]
-        ax.annotate(
-            f'Average Fee: ${avg_fee:.2f}',
-            xy=(avg_fee, y_max * 0.5),
-            xytext=(avg_fee + 2, y_max * 0.7),
-            fontsize=12,
-            fontweight='bold',
-            color='white',
-            bbox=dict(facecolor='#000000FA', edgecolor='#404040', alpha=0.98),
-            arrowprops=dict(
-                arrowstyle='->',
-                color='#00FFFF',
-                lw=2,
-                alpha=0.8
+        self.panels = []
+        for timeframe, box in zip(self.timeframes, layout.panel_boxes()):
+            ax_pie = fig.add_axes(box)
+            ax_pie.set_facecolor('none')
+            ax_pie.text(
+                0.5, 1.1,
+                f'{timeframe} Trading Performance',
+                ha='center',
+                va='bottom',
+                fontsize=14,
+                fontweight='bold',
+                color='white',
+                transform=ax_pie.transAxes
+            )
+
+            # Placeholder wedges; update() sets their angles
+            wedges, texts, autotexts = ax_pie.pie(
+                x=[1, 1],
+                colors=self.colors,
+                autopct='%1.1f%%',
+                startangle=90,
+                labels=['Win', 'Loss'],
+                pctdistance=0.75,
+                wedgeprops=dict(width=0.7, edgecolor='none', linewidth=0),
+                textprops={'fontsize': 12, 'fontweight': 'bold', 'color': 'white'}
+            )
+
+            center = ax_pie.text(
+                0, 0, '',
+                ha='center',
+                va='center',
+                fontsize=13,
+                fontweight='bold',
+                color='white'
+            )
+            summary = ax_pie.text(
+                0.98, 0.02, '',
+                ha='right',
+                va='bottom',
+                fontsize=12,
+                fontweight='bold',
+                color='white',
+                transform=ax_pie.transAxes,
+                bbox=dict(
+                    boxstyle='round,pad=0.8',
+                    facecolor=CHART_BACKGROUND,
+                    edgecolor=CHART_BORDER,
+                    alpha=0.98
+                ),
+                linespacing=1.5
+            )
+            empty = self.empty_label(ax_pie, timeframe)
+            self.axes.append(ax_pie)
+            self.panels.append((ax_pie, wedges, texts, autotexts, center, summary, empty))
+
+        self.logo = add_utg_logo(fig, layout.logo_box)
+
+    def update(self, trade_stats, title_prefix):
+        self.title.set_text(f'{title_prefix} - Trading Statistics Comparison')
+
+        for (ax_pie, wedges, texts, autotexts, center, summary, empty), stats, timeframe in zip(
+                self.panels, trade_stats, self.timeframes):
+            total_trades = stats.trades
+            winning_trades = stats.wins
+            losing_trades = stats.losses
+            win_rate = stats.win_rate
+
+            # Hide the panel of an empty timeframe
+            ax_pie.set_visible(total_trades > 0)
+            empty.set_visible(total_trades == 0)
+            if total_trades == 0:
+                logger.debug(f"No data available for {timeframe}")
+                continue
+
+            # Same geometry as Axes.pie: counter-clockwise from 90 degrees
+            start = 0.25
+            for wedge, label, pct, count in zip(wedges, texts, autotexts, (winning_trades, losing_trades)):
+                frac = count / total_trades
+                wedge.set_theta1(360 * start)
+                wedge.set_theta2(360 * (start + frac))
+                middle = 2 * np.pi * (start + frac / 2)
+                x, y = np.cos(middle), np.sin(middle)
+                label.set_position((1.1 * x, 1.1 * y))
+                label.set_horizontalalignment('left' if x > 0 else 'right')
+                pct.set_position((0.75 * x, 0.75 * y))
+                pct.set_text(f'{100 * frac:1.1f}%')
+                start += frac
+
+            center.set_text(f'Total\nTrades\n{total_trades}')
+            summary.set_text(
+                f"Win Rate: {win_rate:.1f}%\n"
+                f"Winning Trades: {winning_trades}\n"
+                f"Losing Trades: {losing_trades}"
             )
+
+class FeeDistributionTemplate(ChartTemplate):
+    """Fee histograms with their KDE curves, one panel per timeframe."""
+
+    def layout(self, *args):
+        return ChartLayout(
+            grid=self.grid_shape,
+            panel=(6.7, 4.6),
+            margins=(0.85, 0.15, 0.56, 1.05),
+            spacing=(0.85, 0.9),
+            title=0.1,
+            logo=('upper right', 0.6, 0.92, 0.34),
         )
-        
-        # Add timeframe and total trades info
-        ax.text(
-            0.95, 0.95,
-            f'Total Trades: {len(df)}',
-            transform=ax.transAxes,
-            ha='right',
+
+    def build(self, fig, layout):
+        self.axes = [fig.add_axes(box) for box in layout.panel_boxes()[:len(self.timeframes)]]
+        self.title = fig.text(
+            *layout.title_position, '',
+            ha='center',
             va='top',
-            fontsize=12,
+            fontsize=16,
             fontweight='bold',
             color='white'
         )
-        
-        # Customize the plot
-        ax.set_title(f'{timeframe} Fee Distribution', pad=10, fontsize=14, fontweight='bold', color='white')
-        ax.set_xlabel('Estimated Fee (US$)', fontsize=12, color='white')
-        ax.set_ylabel('Frequency', fontsize=12, color='white')
-        ax.grid(True, linestyle='--', alpha=0.1, color='white')
-        ax.tick_params(axis='both', labelsize=10, colors='white')
-        
-        # Set spine colors
+        self.panels = []
+
+        for ax, timeframe in zip(self.axes, self.timeframes):
+            ax.set_facecolor('none')
+            ax.set_title(f'{timeframe} Fee Distribution', pad=10, fontsize=14, fontweight='bold', color='white')
+            ax.set_xlabel('Estimated Fee (US$)', fontsize=12, color='white')
+            ax.set_ylabel('Frequency', fontsize=12, color='white')
+            ax.grid(True, linestyle='--', alpha=0.1, color='white')
+            ax.tick_params(axis='both', labelsize=10, colors='white')
+            for spine in ax.spines.values():
+                spine.set_color(CHART_BORDER)
+
+            kde_line, = ax.plot([], [], color=FEE_HISTOGRAM_COLOR)
+            density_line, = ax.plot([], [], color=FEE_DENSITY_COLOR, linewidth=2, alpha=0.7)
+            for line in (kde_line, density_line):
+                line.sticky_edges.y[:] = (0, np.inf)
+
+            # Average fee line and its annotation
+            average_line = ax.axvline(x=0, color='#00FFFF', linestyle='--', linewidth=2, alpha=0.7)  # Cyan
+            average_label = ax.annotate(
+                '',
+                xy=(0, 0),
+                xytext=(0, 0),
+                fontsize=12,
+                fontweight='bold',
+                color='white',
+                bbox=dict(facecolor=CHART_BACKGROUND, edgecolor=CHART_BORDER, alpha=0.98),
+                arrowprops=dict(
+                    arrowstyle='->',
+                    color='#00FFFF',
+                    lw=2,
+                    alpha=0.8
+                )
+            )
+
+            total = ax.text(
+                0.95, 0.95, '',
+                transform=ax.transAxes,
+                ha='right',
+                va='top',
+                fontsize=12,
+                fontweight='bold',
+                color='white'
+            )
+            self.panels.append({
+                'bars': None,
+                'kde': kde_line,
+                'density': density_line,
+                'average': average_line,
+                'average_label': average_label,
+                'total': total,
+                'empty': self.empty_label(ax, timeframe),
+            })
+
+        self.logo = add_utg_logo(fig, layout.logo_box)
+
+    def update(self, trade_stats, title_prefix):
+        from matplotlib.colors import to_rgba
+
+        self.title.set_text(f'{title_prefix} - Fee Distribution Comparison')
+
+        for ax, panel, stats in zip(self.axes, self.panels, trade_stats):
+            distribution = fee_distribution(stats.fees)
+
+            # Hide the panel of a timeframe without fees
+            ax.set_visible(distribution is not None)
+            panel['empty'].set_visible(distribution is None)
+            if distribution is None:
+                continue
+            edges, counts = distribution['edges'], distribution['counts']
+
+            # Bars are only recreated when the number of bins changes
+            bars = panel['bars']
+            if bars is None or len(bars) != len(counts):
+                if bars is not None:
+                    bars.remove()
+                bars = panel['bars'] = ax.bar(
+                    edges[:-1],
+                    counts,
+                    np.diff(edges),
+                    align='edge',
+                    facecolor=to_rgba(FEE_HISTOGRAM_COLOR, 0.7),
+                    edgecolor=CHART_BORDER
+                )
+            else:
+                for bar, left, count in zip(bars, edges[:-1], counts):
+                    bar.set_x(left)
+                    bar.set_height(count)
+
+            for curve in ('kde', 'density'):
+                panel[curve].set_visible(distribution[curve] is not None)
+                if distribution[curve] is not None:
+                    panel[curve].set_data(*distribution[curve])
+
+            avg_fee = distribution['mean']
+            panel['average'].set_xdata([avg_fee, avg_fee])
+
+            # Fit the y axis to the new bars and curves
+            ax.relim(visible_only=True)
+            ax.autoscale_view(scalex=False)
+            y_max = ax.get_ylim()[1]
+
+            panel['average_label'].set_text(f'Average Fee: ${avg_fee:.2f}')
+            panel['average_label'].xy = (avg_fee, y_max * 0.5)
+            panel['average_label'].set_position((avg_fee + 2, y_max * 0.7))
+            panel['total'].set_text(f'Total Trades: {stats.trades}')
+
+            min_fee, max_fee = distribution['bounds']
+            ax.set_xlim(min_fee - 0.5, min(max_fee + 0.5, 30))
+
+            # Bar outlines at most a tenth of the bar width
+            bar_points = FEE_BIN_WIDTH / np.ptp(ax.get_xlim()) * ax.bbox.width * 72 / self.fig.dpi
+            linewidth = min(_pyplot().rcParams['patch.linewidth'], 0.1 * bar_points)
+            for bar in bars:
+                bar.set_linewidth(linewidth)
+
+def downsample_line(x, y, buckets=None):
+    """
+    Indices of the vertices that draw the line ``x``, ``y`` at ``buckets`` columns.
+
+    ``x`` (numbers or datetimes, sorted) is split into equal-width columns
+    and each column keeps its first, last, lowest and highest point, so the
+    line looks the same while having at most four vertices per column.
+    Lines with fewer points than that are kept whole.
+    """
+    buckets = buckets or CHART_LINE_BUCKETS
+    n = len(x)
+    if n <= 4 * buckets:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    x = x.view('int64') if x.dtype.kind == 'M' else x
+    edges = np.linspace(x[0], x[-1], buckets + 1)[1:-1]
+    column = np.searchsorted(edges, x, side='right')
+    starts = np.flatnonzero(np.diff(column, prepend=-1))
+    lengths = np.diff(starts, append=n)
+
+    keep = [starts, starts + lengths - 1]
+    for extreme in (np.minimum, np.maximum):
+        # The first point of each column that reaches the column's extreme
+        hits = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), lengths))
+        first = np.unique(np.searchsorted(starts, hits, side='right'), return_index=True)[1]
+        keep.append(hits[first])
+    return np.unique(np.concatenate(keep))
+
+class CumulativeFeeTemplate(ChartTemplate):
+    """Cumulative fee lines over time, one line per timeframe."""
+
+    colors = ['#00FFFF', '#FF1493', '#FFD700', '#00FF00', '#00B8FF']  # Cyan, Pink, Gold, Green, Blue
+
+    def layout(self, *args):
+        return ChartLayout(
+            grid=(1, 1),
+            panel=(13.7, 6.55),
+            margins=(1.0, 0.2, 0.8, 0.55),
+            spacing=(0, 0),
+            title=None,
+            logo=('upper right', 0.45, 0.2, 0.05),  # In the top margin, right of the title
+        )
+
+    def build(self, fig, layout):
+        import matplotlib.dates as mdates
+
+        ax = self.ax = fig.add_axes(layout.panel_boxes()[0])
+        self.axes = [ax]
+        ax.set_facecolor('none')
+        ax.xaxis_date()
+
+        # Create border effect
         for spine in ax.spines.values():
-            spine.set_color('#404040')
-        
-        # Set x-axis limits
-        ax.set_xlim(min_fee - 0.5, min(max_fee + 0.5, 30))
-    
-    # Adjust layout
-    plt.tight_layout()
-    
-    # Before saving, add the logo
-    add_utg_logo(fig, 'upper right')
-    
-    # Save the chart
-    filename = f'fee_distribution_comparison_{title_prefix.replace(" ", "_").replace("(", "").replace(")", "")}.png'
-    plt.savefig(
-        filename,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
-    )
-    plt.close()
-    return filename
+            spine.set_color(CHART_BORDER)
+            spine.set_linewidth(1)
 
-def create_gap_tracking_chart(df_3m, df_5m, title_prefix):
-    """Create a clean, professional chart tracking cumulative fees over time."""
-    plt.style.use('dark_background')
-    
-    # Create figure
-    fig, ax = plt.subplots(figsize=(15, 8))
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    ax.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Process data
-    df_3m = df_3m.sort_values('DateTime')
-    df_5m = df_5m.sort_values('DateTime')
-    df_3m['Cumulative_Fee'] = df_3m['Est. Fee'].cumsum()
-    df_5m['Cumulative_Fee'] = df_5m['Est. Fee'].cumsum()
-    
-    # Calculate statistics
-    trades_3m = len(df_3m)
-    trades_5m = len(df_5m)
-    total_fee_3m = df_3m['Est. Fee'].sum()
-    total_fee_5m = df_5m['Est. Fee'].sum()
-    avg_fee_3m = total_fee_3m / trades_3m if trades_3m > 0 else 0
-    avg_fee_5m = total_fee_5m / trades_5m if trades_5m > 0 else 0
-    
-    # Create border effect
-    border_color = '#404040'
-    for spine in ax.spines.values():
-        spine.set_color(border_color)
-        spine.set_linewidth(1)
-    
-    # Plot lines
-    line_3m = ax.plot(df_3m['DateTime'], df_3m['Cumulative_Fee'], 
-                     color='#00FFFF', linewidth=1.5, label='3m')  # Cyan for 3m
-    line_5m = ax.plot(df_5m['DateTime'], df_5m['Cumulative_Fee'], 
-                     color='#FF1493', linewidth=1.5, label='5m')  # Pink for 5m
-    
-    # Add subtle grid
-    ax.grid(True, linestyle='-', alpha=0.1, color='white')
-    
-    # Format axes
-    ax.set_xlabel('', fontsize=10)  # Remove x-label as it's redundant
-    ax.set_ylabel('Cumulative Fee (US$)', fontsize=10, color='white')
-    
-    # Format x-axis
-    ax.xaxis.set_major_locator(mdates.MonthLocator())
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-    ax.tick_params(axis='both', colors='white', labelsize=10)
-    
-    # Add title
-    plt.title(f'{title_prefix} - Cumulative Fee Performance',
-              fontsize=14, fontweight='bold', color='white', pad=20)
-    
-    # Create statistics box
-    stats_3m = (
-        f'3m Performance\n'
-        f'Trades: {trades_3m}\n'
-        f'Total: ${total_fee_3m:,.2f}\n'
-        f'Avg: ${avg_fee_3m:.2f}'
-    )
-    
-    stats_5m = (
-        f'5m Performance\n'
-        f'Trades: {trades_5m}\n'
-        f'Total: ${total_fee_5m:,.2f}\n'
-        f'Avg: ${avg_fee_5m:.2f}'
-    )
-    
-    # Add statistics boxes with clean styling
-    box_style = dict(
-        boxstyle='round,pad=0.5',
-        facecolor='#000000FA',  # 98% opaque black
-        edgecolor=border_color,
-        alpha=0.98  # 98% opacity
-    )
-    
-    # Position stats at the top left
-    ax.text(0.02, 0.98, stats_3m,
-            transform=ax.transAxes,
-            color='white',
-            fontsize=10,
-            fontweight='bold',
-            va='top',
-            linespacing=1.5,
-            bbox=box_style)
-    
-    ax.text(0.02, 0.80, stats_5m,
-            transform=ax.transAxes,
-            color='white',
-            fontsize=10,
-            fontweight='bold',
-            va='top',
-            linespacing=1.5,
-            bbox=box_style)
-    
-    # Set y-axis limits with some padding
-    ymax = max(df_3m['Cumulative_Fee'].max(), df_5m['Cumulative_Fee'].max())
-    ax.set_ylim(0, ymax * 1.1)
-    
-    # Add horizontal line at y=0
-    ax.axhline(y=0, color=border_color, linewidth=1)
-    
-    # Rotate x-axis labels
-    plt.xticks(rotation=45)
-    
-    # Adjust layout
-    plt.tight_layout()
-    
-    # Before saving, add the logo
-    add_utg_logo(fig, 'lower right')
-    
-    # Save the chart
-    filename = f'fee_tracking_{title_prefix.replace(" ", "_").replace("(", "").replace(")", "")}.png'
-    plt.savefig(
-        filename,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
-    )
-    plt.close()
-    return filename
+        self.lines = [
+            ax.plot([], [], color=color, linewidth=1.5, label=timeframe)[0]
+            for timeframe, color in zip(self.timeframes, itertools.cycle(self.colors))
+        ]
+
+        # Add subtle grid
+        ax.grid(True, linestyle='-', alpha=0.1, color='white')
+
+        # Format axes
+        ax.set_xlabel('', fontsize=10)  # Remove x-label as it's redundant
+        ax.set_ylabel('Cumulative Fee (US$)', fontsize=10, color='white')
+        ax.xaxis.set_major_locator(mdates.MonthLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax.tick_params(axis='both', colors='white', labelsize=10)
+        ax.tick_params(axis='x', labelrotation=45)
+
+        self.title = ax.set_title('', fontsize=14, fontweight='bold', color='white', pad=20)
+
+        # Statistics boxes at the top left
+        box_style = dict(
+            boxstyle='round,pad=0.5',
+            facecolor=CHART_BACKGROUND,
+            edgecolor=CHART_BORDER,
+            alpha=0.98  # 98% opacity
+        )
+        # Each box in the colour of its timeframe's line
+        self.summaries = [
+            ax.text(0.02, 0.98 - 0.18 * i, '',
+                    transform=ax.transAxes,
+                    color=line.get_color(),
+                    fontsize=10,
+                    fontweight='bold',
+                    va='top',
+                    linespacing=1.5,
+                    bbox=box_style)
+            for i, line in enumerate(self.lines)
+        ]
+
+        # Add horizontal line at y=0
+        ax.axhline(y=0, color=CHART_BORDER, linewidth=1)
+
+        self.logo = add_utg_logo(fig, layout.logo_box)
+
+    def update(self, trade_stats, title_prefix):
+        self.title.set_text(f'{title_prefix} - Cumulative Fee Performance')
+
+        ymax = None
+        for line, summary, stats, timeframe in zip(self.lines, self.summaries, trade_stats, self.timeframes):
+            series = stats.series
+            line.set_data(series['time'], series['cumulative'])
+            summary.set_text(
+                f'{timeframe} Performance\n'
+                f'Trades: {stats.trades}\n'
+                f'Total: ${stats.fee_total:,.2f}\n'
+                f'Avg: ${stats.fee_average:.2f}'
+            )
+            if stats.trades:
+                peak = np.nanmax(series['cumulative'])
+                ymax = peak if ymax is None else max(ymax, peak)
+
+        # Set axis limits, with some padding above
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if ymax is not None:
+            self.ax.set_ylim(0, ymax * 1.1)
+
+class StrategyComparisonTemplate(ChartTemplate):
+    """Total fees per strategy as a bar chart."""
+
+    colors = ['#00B8FF', '#00FF00', '#FF1493', '#FFD700']  # Cyan, Green, Pink, Gold
+    upright_above = 8  # Strategies beyond which the labels are turned upright
+
+    def layout(self, labels, fees, start_date, page):
+        # Room around the plot for the upright labels and values of many strategies
+        upright = len(fees) > self.upright_above
+        return ChartLayout(
+            grid=(1, 1),
+            panel=(9.3, 4.6),
+            margins=(0.87, 0.65, 1.4 if upright else 0.35, 1.3 if upright else 0.8),
+            spacing=(0, 0),
+            title=None,
+            logo=('upper right', 0.6, 0.11, 0.5 if upright else 0.1),  # In the top margin, right of the title
+        )
+
+    def build(self, fig, layout):
+        ax = self.ax = fig.add_axes(layout.panel_boxes()[0])
+        self.axes = [ax]
+        ax.set_facecolor('none')
+        ax.set_ylabel('Total Fees ($)', color='white', fontsize=12)
+        self.title = ax.set_title('', color='white', fontsize=14, pad=20)
+
+        # Customize grid, spines and tick labels
+        ax.grid(True, axis='y', linestyle='--', alpha=0.1, color='white')
+        for spine in ax.spines.values():
+            spine.set_color(CHART_BORDER)
+        ax.tick_params(axis='both', colors='white')
+
+        self.bars = []
+        self.values = []
+
+        self.logo = add_utg_logo(fig, layout.logo_box)
+
+    def update(self, labels, fees, start_date, page):
+        ax = self.ax
+        positions = range(len(fees))
 
-def filter_data_by_date(df, start_date):
-    """Filter DataFrame to include data from start_date onwards."""
-    return df[df['DateTime'] >= pd.to_datetime(start_date)]
+        # Turn the labels upright for many strategies
+        upright = len(fees) > self.upright_above
+        ax.tick_params(axis='x', labelrotation=90 if upright else 0)
 
-def create_comparative_bar_chart(df_50_3m, df_50_5m, df_110_3m, df_110_5m, start_date):
-    """Create a comparative bar chart showing performance of different strategies."""
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    # Set background colors
-    ax.set_facecolor('#000000FA')  # 98% opaque black
-    fig.patch.set_facecolor('#000000FA')  # 98% opaque black
-    
-    # Calculate total fees for each strategy after start_date
-    fees = []
-    labels = []
-    
-    # Function to safely calculate total fees
-    def get_total_fees(df, strategy_name):
-        if df.empty:
-            print(f"No data available for {strategy_name}")
-            return 0
-        if 'DateTime' not in df.columns:
-            print(f"DateTime column missing in {strategy_name}")
-            return 0
-        if 'Est. Fee' not in df.columns:
-            print(f"Est. Fee column missing in {strategy_name}")
+        # Bars are only recreated when the number of strategies changes
+        if len(self.bars) != len(fees):
+            for artist in self.bars + self.values:
+                artist.remove()
+            self.bars = list(ax.bar(positions, fees, color=self.colors))
+            self.values = [
+                ax.text(0, 0, '',
+                        ha='center', va='bottom',
+                        color='white',
+                        fontsize=10,
+                        fontweight='bold')
+                for _ in self.bars
+            ]
+
+        # Value labels on top of the bars
+        for bar, value, fee in zip(self.bars, self.values, fees):
+            bar.set_height(fee)
+            value.set_position((bar.get_x() + bar.get_width() / 2., fee))
+            value.set_text(f'${fee:,.2f}')
+            value.set_rotation(90 if upright else 0)
+
+        ax.set_xticks(positions, labels)
+        ax.relim()
+        ax.autoscale_view()
+        if upright:
+            # Room above the tallest bar for the longest upright value label
+            label_points = 0.7 * 10 * max(len(value.get_text()) for value in self.values)
+            axes_points = ax.bbox.height * 72 / self.fig.dpi
+            ax.set_ylim(top=max(fees) / max(0.5, 1 - label_points / axes_points))
+        number, pages = page
+        self.title.set_text(
+            f'Strategy Comparison - Total Fees\n(Since {start_date.strftime("%Y-%m-%d")}'
+            + (f', page {number} of {pages})' if pages > 1 else ')')
+        )
+
+def create_combined_win_rate_chart(timeframe_stats, title_prefix, directory=''):
+    """Create a combined win rate chart from a strategy's ``{timeframe: TradeStats}``."""
+    filename = chart_filename('win_rate_comparison', title_prefix, directory)
+    template = get_chart_template(WinRateTemplate, timeframe_stats)
+    return template.render(filename, list(timeframe_stats.values()), title_prefix)
+
+def create_combined_fee_distribution_chart(timeframe_stats, title_prefix, directory=''):
+    """Create a combined fee distribution chart from a strategy's ``{timeframe: TradeStats}``."""
+    filename = chart_filename('fee_distribution_comparison', title_prefix, directory)
+    template = get_chart_template(FeeDistributionTemplate, timeframe_stats)
+    return template.render(filename, list(timeframe_stats.values()), title_prefix)
+
+def create_gap_tracking_chart(timeframe_stats, title_prefix, directory=''):
+    """Create a cumulative fee chart from a strategy's ``{timeframe: TradeStats}``, one line per timeframe."""
+    filename = chart_filename('fee_tracking', title_prefix, directory)
+    template = get_chart_template(CumulativeFeeTemplate, timeframe_stats)
+    # Already downsampled statistics come back unchanged
+    lines = [stats.downsampled() for stats in timeframe_stats.values()]
+    return template.render(filename, lines, title_prefix)
+
+def comparison_pages(strategy_stats, page_size=CHART_COMPARISON_PAGE_SIZE):
+    """
+    Split ``{label: TradeStats}`` into the pages of the comparison chart.
+
+    Strategies without fees are left out and the rest are kept in order, at
+    most ``page_size`` to a page. The list is empty when no strategy has fees.
+    """
+    # Function to safely read total fees
+    def get_total_fees(stats, strategy_name):
+        if stats is None or stats.trades == 0:
+            logger.debug(f"No data available for {strategy_name}")
             return 0
-            
-        filtered_df = df[df['DateTime'] >= start_date]
-        total = filtered_df['Est. Fee'].sum()
-        return total if not pd.isna(total) else 0
-    
-    # Calculate fees for each strategy
-    fees_50_3m = get_total_fees(df_50_3m, "ETH +50 3m")
-    fees_50_5m = get_total_fees(df_50_5m, "ETH +50 5m")
-    fees_110_3m = get_total_fees(df_110_3m, "ETH +110 3m")
-    fees_110_5m = get_total_fees(df_110_5m, "ETH +110 5m")
-    
+        return stats.fee_total
+
     # Add non-zero fees to the chart
-    if fees_50_3m > 0:
-        fees.append(fees_50_3m)
-        labels.append("ETH +50 3m")
-    if fees_50_5m > 0:
-        fees.append(fees_50_5m)
-        labels.append("ETH +50 5m")
-    if fees_110_3m > 0:
-        fees.append(fees_110_3m)
-        labels.append("ETH +110 3m")
-    if fees_110_5m > 0:
-        fees.append(fees_110_5m)
-        labels.append("ETH +110 5m")
-    
+    charted = [(label, stats) for label, stats in strategy_stats.items() if get_total_fees(stats, label) > 0]
+    return [dict(charted[i:i + page_size]) for i in range(0, len(charted), page_size)]
+
+def create_comparative_bar_chart(strategy_stats, start_date, page=(1, 1), directory=''):
+    """
+    Create a comparative bar chart of the total fees in ``{label: TradeStats}``,
+    page ``number`` of ``pages`` given as ``page`` (see ``comparison_pages``).
+    """
+    # Total fees of each strategy since start_date
+    labels = [label for label, stats in strategy_stats.items() if stats.fee_total > 0]
+    fees = [strategy_stats[label].fee_total for label in labels]
     if not fees:
         raise ValueError("No fee data available for any strategy")
-    
-    # Define colors for bars
-    bar_colors = ['#00B8FF', '#00FF00', '#FF1493', '#FFD700']  # Cyan, Green, Pink, Gold
-    
-    # Create bars
-    bars = ax.bar(labels, fees, color=bar_colors)
-    
-    # Customize the chart
-    ax.set_ylabel('Total Fees ($)', color='white', fontsize=12)
-    ax.set_title(f'Strategy Comparison - Total Fees\n(Since {start_date.strftime("%Y-%m-%d")})',
-                 color='white', fontsize=14, pad=20)
-    
-    # Add value labels on top of bars
-    for bar in bars:
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
-                f'${height:,.2f}',
-                ha='center', va='bottom',
-                color='white',
-                fontsize=10,
-                fontweight='bold')
-    
-    # Customize grid and spines
-    ax.grid(True, axis='y', linestyle='--', alpha=0.1, color='white')
-    for spine in ax.spines.values():
-        spine.set_color('#404040')
-    
-    # Customize tick labels
-    ax.tick_params(axis='both', colors='white')
-    
-    # Add UTG logo in top right
-    add_utg_logo(fig, 'upper right')
-    
-    # Save the chart
-    output_file = os.path.join('charts', 'strategy_comparison.png')
-    plt.savefig(
-        output_file,
-        bbox_inches='tight',
-        dpi=300,
-        facecolor='#000000FA',
-        edgecolor='none',
-        transparent=True
-    )
-    plt.close()
-    
-    return output_file
+
+    number, pages = page
+    name = 'strategy_comparison' + (f'_{number}' if pages > 1 else '')
+    output_file = os.path.join(directory or 'charts', name + chart_suffix())
+    return get_chart_template(StrategyComparisonTemplate).render(output_file, labels, fees, start_date, page)
+
+_render_pool = None
+# Libraries the render workers' fork server imports once for all of them
+RENDER_WORKER_PRELOAD = ['numpy', 'pandas', 'matplotlib']
+# Held while a chart renders in-process: the chart templates and pyplot's style
+# settings are per process, and the chart server and bot render from threads
+_render_lock = threading.Lock()
+
+def _init_render_worker():
+    """Warm a render worker: backend, style, fonts and logo are loaded once."""
+    # Leave SIGINT/SIGTERM handling to the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    plt = _pyplot()
+    from matplotlib import font_manager
+
+    plt.style.use('dark_background')
+    for family in ('sans-serif', 'monospace'):
+        font_manager.findfont(font_manager.FontProperties(family=family, weight='bold'))
+    if os.path.exists(LOGO_PATH):
+        _load_logo(LOGO_PATH)
+
+def _render_worker_ready():
+    return os.getpid()
+
+def get_render_pool():
+    """
+    Return the process-wide chart render pool, or None when rendering in-process.
+
+    Workers are started up front and warmed by ``_init_render_worker`` before
+    the first chart is submitted. They come from a fork server (where the
+    platform has one, else they are spawned) rather than being forked from
+    this process: by the time a pool is started or replaced, the chart
+    server, the bot or a run's worker threads may be running, and forking a
+    multi-threaded process can leave locks held in the child forever. The
+    fork server preloads the heavy libraries once, so workers still start
+    with them imported.
+    """
+    global _render_pool
+    if _render_pool is None and RENDER_WORKERS > 1:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(RENDER_WORKER_PRELOAD)
+        else:
+            context = multiprocessing.get_context('spawn')
+        _render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=context,
+            initializer=_init_render_worker
+        )
+        for future in [_render_pool.submit(_render_worker_ready) for _ in range(RENDER_WORKERS)]:
+            future.result()
+        logger.info(f"Render pool started with {RENDER_WORKERS} workers")
+    return _render_pool
+
+def shutdown_render_pool():
+    """Stop the render pool's worker processes."""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+@functools.lru_cache(maxsize=1)
+def _render_fingerprint():
+    """Hash of this module's code and the logo, so changing either invalidates cached renders."""
+    digest = hashlib.sha1(Path(__file__).read_bytes())
+    if os.path.exists(LOGO_PATH):
+        digest.update(str(os.path.getmtime(LOGO_PATH)).encode())
+    return digest.hexdigest()
+
+def chart_cache_key(chart_function, *args):
+    """
+    Content hash of a chart: the chart function, render profile, parameters and input data.
+
+    Trade statistics are identified by the digest of the trades they counted,
+    and DataFrames by the values of ``CHART_DATA_COLUMNS`` they contain, also
+    inside dicts and lists, so unchanged data produces the same key on every run.
+    """
+    digest = hashlib.sha1(_render_fingerprint().encode())
+    digest.update(chart_function.__name__.encode())
+    digest.update(RENDER_PROFILE.encode())
+    for arg in args:
+        _hash_chart_arg(digest, arg)
+    return digest.hexdigest()
+
+def _hash_chart_arg(digest, arg):
+    """Add one chart argument to ``digest``, descending into dicts, lists and tuples."""
+    if isinstance(arg, TradeStats):
+        digest.update(repr((arg.start_date, arg.trades, arg.digest)).encode())
+    elif isinstance(arg, pd.DataFrame):
+        columns = [col for col in CHART_DATA_COLUMNS if col in arg.columns]
+        digest.update(repr((columns, len(arg))).encode())
+        if columns and len(arg):
+            digest.update(pd.util.hash_pandas_object(arg[columns], index=False).to_numpy().tobytes())
+    elif isinstance(arg, dict):
+        digest.update(f"dict:{len(arg)}".encode())
+        for key, value in arg.items():
+            digest.update(repr(key).encode())
+            _hash_chart_arg(digest, value)
+    elif isinstance(arg, (list, tuple)):
+        digest.update(f"{type(arg).__name__}:{len(arg)}".encode())
+        for value in arg:
+            _hash_chart_arg(digest, value)
+    else:
+        digest.update(repr(arg).encode())
+
+def _render_cache_file(key):
+    directory = CACHE_DIR / 'renders'
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{key}.pkl"
+
+def _load_cached_render(key):
+    """Restore a cached render to its output file and return the file name, if cached."""
+    path = _render_cache_file(key)
+    entry = _load_pickle(path)
+    if entry is None:
+        return None
+    filename = entry['filename']
+    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(entry['image'])
+    os.utime(path)
+    return filename
+
+def _store_render(key, job):
+    """Keep a finished render in the cache, evicting the least recently used entries."""
+    if job.cancelled() or job.exception() is not None:
+        return
+    try:
+        filename = job.result()
+        with open(filename, 'rb') as f:
+            _save_pickle(_render_cache_file(key), {'filename': filename, 'image': f.read()})
+
+        entries = sorted((CACHE_DIR / 'renders').glob('*.pkl'), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:-RENDER_CACHE_ENTRIES]:
+            stale.unlink(missing_ok=True)
+    except Exception as e:
+        logger.warning(f"Could not cache render {key}: {str(e)}")
+
+def submit_chart(chart_function, *args):
+    """
+    Queue a chart for rendering and return a Future of its file name.
+
+    Independent charts submitted one after another render concurrently in the
+    render pool. Without a pool the chart is rendered right away and the
+    returned Future is already resolved.
+
+    Charts whose function, parameters and input data match an earlier render
+    are restored from the render cache instead of being rendered again. The
+    Future's ``cache_key`` identifies the chart's content for upload caching.
+    """
+    key = chart_cache_key(chart_function, *args) if RENDER_CACHE_ENTRIES > 0 else None
+    cached = _load_cached_render(key) if key else None
+    if cached is not None:
+        logger.info(f"Reusing cached render of {chart_function.__name__}: {cached}")
+        future = Future()
+        future.set_result(cached)
+        future.cache_key = key
+        return future
+
+    future = _submit_render(chart_function, *args)
+    future.cache_key = key
+    if key:
+        future.add_done_callback(functools.partial(_store_render, key))
+    return future
+
+def _measured_render(chart_function, *args):
+    """Render a chart, returning its file name and the metrics records of the render."""
+    metrics = RunMetrics()
+    token = _run_metrics.set(metrics)
+    try:
+        with measure('chart', chart=chart_function.__name__) as record:
+            filename = chart_function(*args)
+            record['file_bytes'] = os.path.getsize(filename)
+        return filename, metrics.records
+    finally:
+        _run_metrics.reset(token)
+
+def _submit_render(chart_function, *args):
+    metrics = _run_metrics.get()
+    pool = get_render_pool()
+    if pool is None:
+        job = Future()
+        try:
+            with _render_lock:
+                job.set_result(_measured_render(chart_function, *args))
+        except Exception as e:
+            job.set_exception(e)
+    else:
+        try:
+            job = pool.submit(_measured_render, chart_function, *args)
+        except BrokenProcessPool:
+            logger.warning("Render pool is broken, starting a new one")
+            shutdown_render_pool()
+            job = get_render_pool().submit(_measured_render, chart_function, *args)
+
+    # Resolve to the file name once the render's records joined the run that asked for it
+    future = Future()
+    future.add_done_callback(lambda f: job.cancel() if f.cancelled() else None)
+
+    def resolve(job):
+        if future.cancelled():
+            return
+        try:
+            filename, records = job.result()
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        if metrics is not None:
+            metrics.records.extend(records)
+        future.set_result(filename)
+
+    job.add_done_callback(resolve)
+    return future
 
 def check_and_create_assets():
     """Ensure all required assets are in place."""
     logger.info("Checking required assets...")
     
+    # Create necessary directories
+    ASSETS_DIR.mkdir(exist_ok=True)
+    CHARTS_DIR.mkdir(exist_ok=True)
+    
     # Check if logo exists in assets directory
     if not os.path.exists(LOGO_PATH):
         default_logo = BASE_DIR / 'utgl.png'
@@ -1000,131 +3052,902 @@ def check_and_create_assets():
         else:
             logger.warning(f"Logo file not found at {default_logo}")
 
+class RunTimeout(BaseException):
+    """
+    Raised when a pipeline run goes past its time limit.
+
+    Not an ``Exception``, so the pipeline's per-stage error handling does not
+    turn a timed-out run into one that merely reported errors.
+    """
+
+# Monotonic deadline of the run in progress, if it has a time limit
+_run_deadline = None
+
+def check_deadline(stage):
+    """Abort the current run if it has used up its time limit."""
+    if _run_deadline is not None and time.monotonic() > _run_deadline:
+        raise RunTimeout(f"Run timed out before {stage}")
+
+def remaining_run_time():
+    """Seconds left before the current run's deadline, or None without one."""
+    if _run_deadline is None:
+        return None
+    return max(_run_deadline - time.monotonic(), 0)
+
+# Threads the blocking stages of the run in progress (Sheets requests,
+# statistics) run in. They are not joined when the run ends, so a request still
+# hanging at the deadline does not hold the run up.
+_run_executor = None
+
+async def _in_thread(function, *args):
+    """Like ``asyncio.to_thread``, in the run's own threads."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _run_executor, functools.partial(context.run, function, *args)
+    )
+
+async def _chart_result(job):
+    """Wait for a submitted chart without blocking the event loop (bounded by the run's deadline)."""
+    return await asyncio.wrap_future(job)
+
+async def _send_strategy_charts(telegram, strategy, charts):
+    """Send a strategy's ``(file, caption, cache_key)`` charts as one album or one by one."""
+    if TELEGRAM_ALBUMS:
+        await telegram.send_album(charts)
+    else:
+        await asyncio.gather(*(telegram.send_photo(*chart) for chart in charts))
+    print(f"✅ Charts for {strategy} strategy have been generated and sent successfully!")
+
+async def _send_comparison_charts(telegram, charts):
+    """Send the pages of the comparison chart in order, as albums or one after another."""
+    if TELEGRAM_ALBUMS:
+        await telegram.send_album(charts)
+    else:
+        for chart in charts:
+            await telegram.send_photo(*chart)
+
 def main():
     """
     Main function to generate trading analysis charts and send them to Telegram.
     """
+    asyncio.run(_run_pipeline_until_deadline())
+
+async def _run_pipeline_until_deadline():
+    """
+    Run the pipeline, cancelling whatever it awaits (a Sheets fetch, a chart,
+    a Telegram request) once the run's deadline passes.
+    """
+    global _run_executor
+    _run_executor = ThreadPoolExecutor(thread_name_prefix='pipeline')
+    try:
+        await asyncio.wait_for(run_pipeline(), remaining_run_time())
+    except asyncio.TimeoutError:
+        # Also raised by requests timing out inside the pipeline
+        if remaining_run_time() == 0:
+            raise RunTimeout("Run timed out") from None
+        raise
+    finally:
+        _run_executor.shutdown(wait=False, cancel_futures=True)
+        _run_executor = None
+
+async def run_pipeline():
+    """Run one update inside a single event loop and Telegram session."""
     logger.info("Starting chart generation process")
     
-    try:
-        # Ensure assets are in place
-        check_and_create_assets()
-        
-        # Set start date
-        start_date = pd.to_datetime('2025-04-13')
-        
-        # Send initial message to Telegram
-        asyncio.run(send_telegram_message("📊 Liquidity Provider Analysis Charts Update"))
-        
-        # Load all data first
-        logger.info("Loading data from Google Sheets...")
-        
-        # Define sheet names exactly as they appear in Google Sheets
-        sheets = {
-            'ETH_110_3m': "(+110) ETH 3m!A:L",
-            'ETH_110_5m': "(+110) ETH 5m!A:L",
-            'ETH_50_3m': "(+50) ETH 3m!A:L",
-            'ETH_50_5m': "(+50) ETH 5m!A:L"
-        }
-        
-        # Load data for each sheet
-        data = {}
-        for name, range_name in sheets.items():
+    async with _delivery_factory() as telegram:
+        try:
+            # Ensure assets are in place
+            check_and_create_assets()
+            
+            # Set start date
+            start_date = pd.to_datetime(REPORT_START_DATE)
+            
+            # Send initial message to Telegram while the data loads
+            header = asyncio.create_task(telegram.send_message("📊 Liquidity Provider Analysis Charts Update"))
+            
+            # Load all data first
+            check_deadline("loading data")
+            logger.info("Loading data from Google Sheets...")
+            
+            # Discover the strategy tabs, then load every one of them from
+            # cache or in batched requests
+            data = {}
+            errors = {}
             try:
-                logger.info(f"Loading {name} data...")
-                logger.debug(f"Requesting range: {range_name}")
-                data[name] = load_data_from_sheets(SPREADSHEET_ID, range_name)
-                logger.info(f"✅ {name} data loaded successfully")
+                revision = await _in_thread(get_spreadsheet_revision, SPREADSHEET_ID)
+                registry = await _in_thread(load_strategy_registry, SPREADSHEET_ID, revision)
+                ranges = [range_name for timeframes in registry.values() for range_name in timeframes.values()]
+                frames = await _in_thread(load_trade_data, SPREADSHEET_ID, ranges, errors, revision)
             except Exception as e:
-                error_msg = f"❌ Error loading {name}: {str(e)}"
+                error_msg = f"❌ Error loading sheets: {str(e)}"
                 logger.error(error_msg)
-                asyncio.run(send_telegram_message(error_msg))
-                continue
-        
-        if not data:
-            raise Exception("No data could be loaded from any sheet")
+                errors[None] = error_msg
+                registry = {}
+                frames = {}
             
-        try:
-            # Create and send comparative bar chart
-            logger.info("Creating comparative bar chart...")
-            comparison_file = create_comparative_bar_chart(
-                data.get('ETH_50_3m', pd.DataFrame()),
-                data.get('ETH_50_5m', pd.DataFrame()),
-                data.get('ETH_110_3m', pd.DataFrame()),
-                data.get('ETH_110_5m', pd.DataFrame()),
-                start_date
-            )
+            # Keep the update header first in the chat
+            await header
+            if None in errors:
+                await telegram.send_message(errors.pop(None))
             
-            # Ensure the chart file was created
-            if not os.path.exists(comparison_file):
-                raise FileNotFoundError(f"Chart file not created: {comparison_file}")
-                
-            asyncio.run(send_telegram_photo(
-                comparison_file,
-                f"Strategy Comparison - Total Fee Performance (Since {start_date.strftime('%d/%m/%Y')})"
-            ))
+            for strategy, timeframes in registry.items():
+                for timeframe, range_name in timeframes.items():
+                    name = f"{strategy} {timeframe}"
+                    if range_name in frames:
+                        data[range_name] = frames[range_name]
+                        logger.info(f"✅ {name} data loaded successfully")
+                    elif range_name in errors:
+                        error_msg = f"❌ Error loading {name}: {str(errors[range_name])}"
+                        logger.error(error_msg)
+                        await telegram.send_message(error_msg)
             
-            # Process each strategy (+110 and +50)
-            strategies = [
-                ('+50', data.get('ETH_50_3m', pd.DataFrame()), data.get('ETH_50_5m', pd.DataFrame())),
-                ('+110', data.get('ETH_110_3m', pd.DataFrame()), data.get('ETH_110_5m', pd.DataFrame()))
-            ]
+            if not data:
+                raise Exception("No data could be loaded from any sheet")
             
-            for strategy, df_3m, df_5m in strategies:
-                if df_3m.empty and df_5m.empty:
-                    print(f"\nSkipping {strategy} strategy - no data available")
-                    continue
-                    
-                print(f"\nProcessing {strategy} strategy...")
+            # Fold the newly loaded trades into the running statistics
+            stats = await _in_thread(load_trade_stats, SPREADSHEET_ID, frames, start_date)
+            publish_chart_data(registry, stats, start_date)
                 
-                # Filter data by date
-                filtered_3m = filter_data_by_date(df_3m, start_date) if not df_3m.empty else df_3m
-                filtered_5m = filter_data_by_date(df_5m, start_date) if not df_5m.empty else df_5m
+            sends = []
+            try:
+                # Queue every chart up front so they render in parallel, then
+                # send each one as soon as it is ready
+                check_deadline("comparative bar chart")
+                logger.info("Creating comparative bar chart...")
+                strategy_stats = {
+                    f"{strategy} {timeframe}": stats[range_name]
+                    for strategy, timeframes in registry.items()
+                    for timeframe, range_name in timeframes.items()
+                    if range_name in stats
+                }
+                pages = comparison_pages({label: ts.summary() for label, ts in strategy_stats.items()})
+                if not pages:
+                    raise ValueError("No fee data available for any strategy")
+                comparison_jobs = [
+                    submit_chart(create_comparative_bar_chart, summaries, start_date, (number, len(pages)))
+                    for number, summaries in enumerate(pages, 1)
+                ]
                 
-                try:
-                    # Check required columns before creating charts
-                    required_columns = ['Win Rate', 'Est. Fee']
-                    for df, timeframe in [(filtered_3m, '3m'), (filtered_5m, '5m')]:
-                        if not df.empty:
-                            missing_cols = [col for col in required_columns if col not in df.columns]
-                            if missing_cols:
-                                raise ValueError(f"Missing required columns in {timeframe} data: {', '.join(missing_cols)}")
+                strategy_jobs = []
+                for strategy, timeframes in registry.items():
+                    if all(data.get(range_name, pd.DataFrame()).empty for range_name in timeframes.values()):
+                        print(f"\nSkipping {strategy} strategy - no data available")
+                        continue
                     
-                    # Create combined charts
-                    win_rate_file = create_combined_win_rate_chart(filtered_3m, filtered_5m, f"ETH {strategy}")
-                    fee_dist_file = create_combined_fee_distribution_chart(filtered_3m, filtered_5m, f"ETH {strategy}")
+                    # Statistics since the start date; a missing timeframe has none
+                    timeframe_stats = {
+                        timeframe: stats.get(range_name, TradeStats(start_date))
+                        for timeframe, range_name in timeframes.items()
+                    }
                     
-                    # Send charts to Telegram
-                    logger.info(f"Sending charts for {strategy} strategy")
-                    asyncio.run(send_telegram_photo(win_rate_file, f"ETH {strategy} - Trading Statistics Comparison"))
-                    asyncio.run(send_telegram_photo(fee_dist_file, f"ETH {strategy} - Fee Distribution Comparison"))
+                    try:
+                        # Check required columns before creating charts
+                        required_columns = ['Win Rate', 'Est. Fee']
+                        for timeframe, range_name in timeframes.items():
+                            df = data.get(range_name, pd.DataFrame())
+                            if not df.empty:
+                                missing_cols = [col for col in required_columns if col not in df.columns]
+                                if missing_cols:
+                                    raise ValueError(f"Missing required columns in {timeframe} data: {', '.join(missing_cols)}")
+                        
+                        # Create combined charts
+                        summary_stats = {timeframe: ts.summary() for timeframe, ts in timeframe_stats.items()}
+                        line_stats = {timeframe: ts.downsampled() for timeframe, ts in timeframe_stats.items()}
+                        jobs = (
+                            submit_chart(create_combined_win_rate_chart, summary_stats, strategy),
+                            submit_chart(create_combined_fee_distribution_chart, timeframe_stats, strategy),
+                            submit_chart(create_gap_tracking_chart, line_stats, strategy),
+                        )
+                    except Exception as e:
+                        jobs = e
+                    strategy_jobs.append((strategy, jobs))
+                
+                comparison_charts = []
+                for number, comparison_job in enumerate(comparison_jobs, 1):
+                    comparison_file = await _chart_result(comparison_job)
                     
-                    print(f"✅ Charts for {strategy} strategy have been generated and sent successfully!")
-                except Exception as e:
-                    error_msg = f"❌ Error processing charts for {strategy} strategy: {str(e)}"
-                    print(error_msg)
-                    logger.error(error_msg)
-                    asyncio.run(send_telegram_message(error_msg))
-                    continue
-            
-            logger.info("All charts have been generated and sent successfully!")
+                    # Ensure the chart file was created
+                    if not os.path.exists(comparison_file):
+                        raise FileNotFoundError(f"Chart file not created: {comparison_file}")
+                    
+                    caption = f"Strategy Comparison - Total Fee Performance (Since {start_date.strftime('%d/%m/%Y')})"
+                    if len(comparison_jobs) > 1:
+                        caption += f" - {number}/{len(comparison_jobs)}"
+                    comparison_charts.append((comparison_file, caption, comparison_job.cache_key))
+                sends.append(asyncio.create_task(_send_comparison_charts(telegram, comparison_charts)))
+                
+                # Fees over the recent windows, from the same statistics
+                windows = report_windows()
+                if windows:
+                    for message in window_report(strategy_stats, windows, pd.Timestamp.now()):
+                        sends.append(asyncio.create_task(telegram.send_message(message)))
+                
+                for strategy, jobs in strategy_jobs:
+                    check_deadline(f"charts for {strategy} strategy")
+                    print(f"\nProcessing {strategy} strategy...")
+                    
+                    try:
+                        if isinstance(jobs, Exception):
+                            raise jobs
+                        win_rate_job, fee_dist_job, tracking_job = jobs
+                        win_rate_file, fee_dist_file, tracking_file = [await _chart_result(job) for job in jobs]
+                        
+                        # Send charts to Telegram
+                        logger.info(f"Sending charts for {strategy} strategy")
+                        sends.append(asyncio.create_task(_send_strategy_charts(telegram, strategy, [
+                            (win_rate_file, f"{strategy} - Trading Statistics Comparison", win_rate_job.cache_key),
+                            (fee_dist_file, f"{strategy} - Fee Distribution Comparison", fee_dist_job.cache_key),
+                            (tracking_file, f"{strategy} - Cumulative Fee Performance", tracking_job.cache_key),
+                        ])))
+                    except Exception as e:
+                        error_msg = f"❌ Error processing charts for {strategy} strategy: {str(e) or type(e).__name__}"
+                        print(error_msg)
+                        logger.error(error_msg)
+                        sends.append(asyncio.create_task(telegram.send_message(error_msg)))
+                        continue
+                
+                await asyncio.gather(*sends)
+                logger.info("All charts have been generated and sent successfully!")
+                
+            except Exception as e:
+                error_msg = f"❌ Error processing charts: {str(e) or type(e).__name__}"
+                logger.error(error_msg, exc_info=True)
+                await asyncio.gather(*sends, return_exceptions=True)
+                await telegram.send_message(error_msg)
             
         except Exception as e:
-            error_msg = f"❌ Error processing charts: {str(e)}"
+            error_msg = f"❌ An error occurred: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            asyncio.run(send_telegram_message(error_msg))
-        
-    except Exception as e:
-        error_msg = f"❌ An error occurred: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        asyncio.run(send_telegram_message(error_msg))
+            await telegram.send_message(error_msg)
 
-if __name__ == "__main__":
+def run_once(timeout=None, interval=None):
+    """
+    Run the pipeline once, with an optional time limit in seconds.
+
+    The run's metrics are written afterwards (see ``write_run_metrics``);
+    ``interval`` is the time between scheduled runs they are measured against.
+    """
+    global _run_deadline
+    _run_deadline = time.monotonic() + timeout if timeout else None
+    metrics = RunMetrics(interval, timeout)
+    token = _run_metrics.set(metrics)
+    metrics.start()
+    status = 'failed'
     try:
         main()
+        status = 'ok'
+    except RunTimeout:
+        status = 'timeout'
+        raise
+    finally:
+        _run_deadline = None
+        _run_metrics.reset(token)
+        metrics.finish(status)
+        write_run_metrics(metrics)
+        # Keep a long-running process flat: drop any figures left open by a
+        # failed chart and collect the frames of this run
+        if 'matplotlib.pyplot' in sys.modules:
+            _pyplot().close('all')
+        gc.collect()
+
+def next_run_time(now, interval, offset=0):
+    """First scheduled start strictly after ``now`` on the wall-clock grid."""
+    return ((now - offset) // interval + 1) * interval + offset
+
+def run_daemon(interval=RUN_INTERVAL, offset=RUN_OFFSET, timeout=RUN_TIMEOUT, push=True, serve=None, bot=False):
+    """
+    Keep the process resident and run the pipeline on a fixed schedule.
+
+    Start times are taken from a wall-clock grid (``offset`` seconds past each
+    multiple of ``interval``), so runs do not drift by their own duration. A run
+    that overruns the next start time makes the daemon skip the missed slots
+    instead of starting runs back to back.
+
+    With a ``serve`` port, charts are also served over HTTP from the data of
+    the latest run, and with ``bot`` the chat's chart commands are answered
+    from it; without ``push`` the scheduled runs only bring that data up to
+    date and send no updates to Telegram.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current run")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Load every library and start the render workers up front so the first
+    # scheduled run is as fast as the rest
+    import_runtime_dependencies()
+    get_render_pool()
+    charts = ChartServer()
+    server = start_chart_server(port=serve, charts=charts) if serve is not None else None
+    commands = TelegramCommands(charts).start() if bot else None
+
+    logger.info(f"Daemon started: every {interval}s (offset {offset}s), run timeout {timeout}s")
+    next_run = time.time()
+    while not stop.is_set():
+        delay = next_run - time.time()
+        if delay > 0 and stop.wait(delay):
+            break
+
+        started = time.time()
+        logger.info("🔄 Running scheduled update...")
+        try:
+            if push:
+                run_once(timeout, interval)
+            else:
+                refresh_chart_data()
+        except RunTimeout as e:
+            logger.error(f"Scheduled run aborted: {str(e)}")
+        except Exception:
+            logger.error("Scheduled run failed", exc_info=True)
+        finished = time.time()
+
+        next_run = next_run_time(finished, interval, offset)
+        missed = int((next_run - next_run_time(started, interval, offset)) // interval)
+        if missed > 0:
+            logger.warning(f"Run took {finished - started:.0f}s, skipped {missed} scheduled run(s)")
+        logger.info(f"⏰ Next update at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_run))}")
+
+    if server is not None:
+        server.shutdown()
+    if commands is not None:
+        commands.shutdown()
+    shutdown_render_pool()
+    logger.info("Daemon stopped")
+
+# Chart server
+#
+# With --serve, charts are also available over HTTP, rendered on demand from
+# the trade statistics of the latest update:
+#
+#   GET /charts                                 strategies, timeframes and chart names (JSON)
+#   GET /charts/comparison?since=YYYY-MM-DD     total fees of every strategy, one page
+#                         &page=N               of CHART_COMPARISON_PAGE_SIZE at a time
+#   GET /charts/{strategy}/{chart}?since=...    a chart of SERVED_CHARTS for one strategy
+#
+# A chart's content hash is its ETag, so a client holding the current image
+# gets a 304 without a render. Recent images are served from an LRU cache and
+# concurrent requests for the same chart share one render in the render pool.
+
+# Strategy charts by URL name: chart function and the copy of the statistics it reads
+SERVED_CHARTS = {
+    'win-rate': (create_combined_win_rate_chart, TradeStats.summary),
+    'fee-distribution': (create_combined_fee_distribution_chart, None),
+    'cumulative-fees': (create_gap_tracking_chart, TradeStats.downsampled),
+}
+# Longest a request waits for its chart to render, in seconds
+CHART_SERVER_RENDER_TIMEOUT = 120
+
+CHART_MEDIA_TYPES = {'PNG': 'image/png', 'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+ChartData = collections.namedtuple('ChartData', 'registry stats start_date')
+
+# Strategy registry and statistics of the latest update, read by the chart server
+_chart_data = None
+
+def publish_chart_data(registry, stats, start_date):
+    """Make an update's ``{range: TradeStats}`` the data the chart server renders from."""
+    global _chart_data
+    _chart_data = ChartData(registry, stats, pd.Timestamp(start_date))
+
+def refresh_chart_data():
+    """Bring the trade statistics up to date and publish them, without sending anything."""
+    start_date = pd.to_datetime(REPORT_START_DATE)
+    revision = get_spreadsheet_revision(SPREADSHEET_ID)
+    registry = load_strategy_registry(SPREADSHEET_ID, revision)
+    ranges = [range_name for timeframes in registry.values() for range_name in timeframes.values()]
+    errors = {}
+    frames = load_trade_data(SPREADSHEET_ID, ranges, errors, revision)
+    for range_name, error in errors.items():
+        logger.error(f"❌ Error loading {range_name}: {str(error)}")
+    publish_chart_data(registry, load_trade_stats(SPREADSHEET_ID, frames, start_date), start_date)
+    logger.info(f"Chart data refreshed: {len(frames)} of {len(ranges)} ranges loaded")
+
+class ChartServer:
+    """
+    Answers chart requests from the published trade statistics.
+
+    ``respond`` maps a request to a status, headers and body; the rendered
+    images of the last ``entries`` charts are kept by content hash.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = CHART_SERVER_CACHE_ENTRIES if entries is None else entries
+        self.images = collections.OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def respond(self, target, if_none_match=None):
+        """Status, headers and body of the response to ``GET target``."""
+        url = urllib.parse.urlsplit(target)
+        parts = [urllib.parse.unquote(part) for part in url.path.split('/') if part]
+        data = _chart_data
+        if not parts or parts[0] != 'charts':
+            return self.error(404, "Not found")
+        if data is None:
+            return self.error(503, "No trade data loaded yet")
+
+        if len(parts) == 1:
+            index = {
+                'strategies': {strategy: list(timeframes) for strategy, timeframes in data.registry.items()},
+                'charts': ['comparison', *SERVED_CHARTS],
+                'comparison_pages': len(self.comparison_pages(data, data.start_date)),
+                'start_date': data.start_date.isoformat(),
+            }
+            return 200, {'Content-Type': 'application/json'}, json.dumps(index).encode()
+
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            since = query.get('since', [None])[-1]
+            since = self.since_date(data, since)
+        except (ValueError, TypeError):
+            return self.error(400, f"Invalid since date: {since}")
+        page = query.get('page', ['1'])[-1]
+        if not page.isdigit():
+            return self.error(400, f"Invalid page: {page}")
+
+        if parts[1:] == ['comparison']:
+            try:
+                key, build = self.comparison(data, since, int(page))
+            except LookupError as e:
+                return self.error(404, str(e))
+        elif len(parts) == 3 and parts[1] in data.registry and parts[2] in SERVED_CHARTS:
+            key, build = self.strategy_chart(data, parts[1], parts[2], since)
+        else:
+            return self.error(404, "No such chart")
+
+        etag = f'"{key}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+            return 304, headers, b''
+        try:
+            image = self.chart(key, build)
+        except Exception as e:
+            logger.error(f"❌ Error rendering {url.path}: {str(e) or type(e).__name__}")
+            return self.error(500, f"Could not render chart: {str(e) or type(e).__name__}")
+        headers['Content-Type'] = CHART_MEDIA_TYPES[RENDER_PROFILES[RENDER_PROFILE]['format']]
+        return 200, headers, image
+
+    @staticmethod
+    def error(status, message):
+        return status, {'Content-Type': 'text/plain; charset=utf-8'}, message.encode()
+
+    @staticmethod
+    def since_date(data, text=None):
+        """First trade date of a chart asked for since ``text``, never before the report start."""
+        return max(pd.Timestamp(text), data.start_date) if text else data.start_date
+
+    @staticmethod
+    def comparison_pages(data, since):
+        """The pages of the comparison chart since ``since``, see ``comparison_pages``."""
+        with _trade_stats_lock:
+            totals = {
+                f"{strategy} {timeframe}": data.stats[range_name].window(since)
+                for strategy, timeframes in data.registry.items()
+                for timeframe, range_name in timeframes.items()
+                if range_name in data.stats
+            }
+        return comparison_pages(totals)
+
+    @classmethod
+    def comparison(cls, data, since, page=1):
+        """
+        Content hash and builder of page ``page`` of the comparison chart since
+        ``since``. Raises LookupError when the chart has no such page, or none
+        at all because no strategy has fees since ``since``.
+        """
+        pages = cls.comparison_pages(data, since)
+        if not pages:
+            raise LookupError(f"No trades with fees since {since.strftime('%Y-%m-%d')}")
+        if not 1 <= page <= len(pages):
+            raise LookupError(f"No page {page}, the comparison chart has {len(pages)}")
+        args = (pages[page - 1], since, (page, len(pages)))
+        return chart_cache_key(create_comparative_bar_chart, *args), lambda: (create_comparative_bar_chart, *args)
+
+    @staticmethod
+    def strategy_chart(data, strategy, chart, since, timeframes=None):
+        """
+        Content hash and builder of one of ``strategy``'s ``SERVED_CHARTS`` since
+        ``since``, of all its timeframes or only of ``timeframes``.
+        """
+        chart_function, reduce = SERVED_CHARTS[chart]
+        title = strategy if since == data.start_date else f"{strategy} since {since.strftime('%Y-%m-%d')}"
+        ranges = {
+            timeframe: range_name for timeframe, range_name in data.registry[strategy].items()
+            if timeframes is None or timeframe in timeframes
+        }
+        empty = TradeStats(data.start_date)
+        with _trade_stats_lock:
+            stats = {timeframe: data.stats.get(range_name, empty) for timeframe, range_name in ranges.items()}
+            key = chart_cache_key(chart_function, stats, title)
+
+        def build():
+            with _trade_stats_lock:
+                timeframe_stats = {timeframe: ts.since(since) for timeframe, ts in stats.items()}
+            if reduce is not None:
+                timeframe_stats = {timeframe: reduce(ts) for timeframe, ts in timeframe_stats.items()}
+            return chart_function, timeframe_stats, title
+
+        return key, build
+
+    def chart(self, key, build):
+        """
+        The image of the chart with content hash ``key``.
+
+        Taken from the cache or from a render of the same chart already in
+        progress; otherwise ``build()`` gives the chart function and arguments
+        to render in the render pool.
+        """
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                return self.images[key]
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pending[key] = Future()
+                rendering = True
+            else:
+                rendering = False
+
+        if rendering:
+            try:
+                image = self.render(*build())
+            except BaseException as e:
+                with self.lock:
+                    del self.pending[key]
+                future.set_exception(e)
+            else:
+                with self.lock:
+                    del self.pending[key]
+                    if self.entries > 0:
+                        self.images[key] = image
+                        while len(self.images) > self.entries:
+                            self.images.popitem(last=False)
+                future.set_result(image)
+        return future.result()
+
+    @staticmethod
+    def render(chart_function, *args):
+        """Render a chart into a directory of its own and return the image."""
+        with tempfile.TemporaryDirectory(prefix='hei_chart-') as directory:
+            filename = _submit_render(chart_function, *args, directory).result(CHART_SERVER_RENDER_TIMEOUT)
+            with open(filename, 'rb') as f:
+                return f.read()
+
+def start_chart_server(host=None, port=None, charts=None):
+    """
+    Serve charts over HTTP from a background thread and return the server; stop
+    it with ``shutdown()``. ``charts`` is the ``ChartServer`` to answer from.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    charts = charts or ChartServer()
+
+    class ChartRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, body = charts.respond(self.path, self.headers.get('If-None-Match'))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer(
+        (host or CHART_SERVER_HOST, CHART_SERVER_PORT if port is None else port),
+        ChartRequestHandler
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='chart-server', daemon=True).start()
+    logger.info(f"Serving charts on http://{server.server_address[0]}:{server.server_port}/charts")
+    return server
+
+# Telegram commands
+#
+# With --bot, the chart chat can also ask for charts:
+#
+#   /winrate ETH +50 [3m] [since YYYY-MM-DD]      win rates of a strategy, or of one timeframe
+#   /fees ETH +110 [3m] [since YYYY-MM-DD]        fee distribution
+#   /cumulative ETH +110 [3m] [since YYYY-MM-DD]  cumulative fees
+#   /compare [PAGE] [since YYYY-MM-DD]            total fees of every strategy
+#
+# Commands are answered from the trade statistics of the latest update and
+# never fetch the sheets. Their charts come from the same cache and shared
+# renders as the chart server's, and a chart uploaded before is sent again by
+# its file_id without a render. A command asking for a chart that was sent to
+# the chat in the last TELEGRAM_COMMAND_COOLDOWN seconds (or is still being
+# answered) gets a short notice instead, so a busy chat gets each chart once.
+# A chart that could not be rendered or sent can be asked for again at once.
+
+# Chart commands: the SERVED_CHARTS chart each answers with (None for the comparison)
+BOT_COMMANDS = {'winrate': 'win-rate', 'fees': 'fee-distribution', 'cumulative': 'cumulative-fees', 'compare': None}
+# Seconds a getUpdates request waits for new messages
+TELEGRAM_POLL_TIMEOUT = 30
+
+class TelegramCommands:
+    """
+    Answers the chart commands sent to the chat, polling the Bot API for them.
+
+    Charts are taken from ``charts``, a ``ChartServer`` that can be shared with
+    the HTTP chart server. Start with ``start()`` and stop with ``shutdown()``.
+    """
+
+    def __init__(self, charts=None, cooldown=None, poll_timeout=TELEGRAM_POLL_TIMEOUT):
+        self.charts = charts or ChartServer()
+        self.cooldown = TELEGRAM_COMMAND_COOLDOWN if cooldown is None else cooldown
+        self.poll_timeout = poll_timeout
+        self.username = None
+        self.answered = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='telegram-commands', daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        """Stop polling, waiting for the request in flight and the answers being sent."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_timeout + 10)
+
+    def run(self):
+        try:
+            asyncio.run(self.poll())
+        except Exception:
+            logger.error("Telegram commands stopped", exc_info=True)
+
+    async def poll(self):
+        """Answer commands until ``shutdown()``, starting with those sent from now on."""
+        async with TelegramDelivery() as telegram:
+            self.username = telegram.bot.username.lower()
+            # Drop what was sent while the bot was down rather than answer a backlog at once
+            pending = await telegram.bot.get_updates(offset=-1, timeout=0)
+            offset = pending[-1].update_id + 1 if pending else None
+            logger.info(f"Answering chart commands to @{telegram.bot.username}")
+
+            answers = set()
+            while not self._stop.is_set():
+                try:
+                    updates = await telegram.bot.get_updates(
+                        offset, timeout=self.poll_timeout, allowed_updates=['message']
+                    )
+                except Exception as e:
+                    logger.warning(f"Error polling Telegram for commands: {str(e)}")
+                    await asyncio.sleep(5)
+                    continue
+                for update in updates:
+                    offset = update.update_id + 1
+                    message = update.message
+                    if message is None or not message.text or str(message.chat_id) != str(telegram.chat_id):
+                        continue
+                    answer = asyncio.create_task(self.answer(telegram, message))
+                    answers.add(answer)
+                    answer.add_done_callback(answers.discard)
+                telegram._save_file_ids()
+            await asyncio.gather(*answers)
+
+    def request(self, data, text):
+        """
+        What a message asks for: None if it is no command to this bot, else the
+        reply's key and either its text or the chart builder and caption.
+        """
+        words = text.split()
+        if not words or not words[0].startswith('/'):
+            return None
+        command, _, username = words[0][1:].partition('@')
+        command = command.lower()
+        if username and username.lower() != self.username:
+            return None
+        if command in ('start', 'help'):
+            return command, self.usage(data)
+        if command not in BOT_COMMANDS:
+            return None
+        if data is None:
+            return 'no data', "No trade data loaded yet, try again after the next update."
+
+        words = words[1:]
+        since = None
+        lowered = [word.lower() for word in words]
+        if 'since' in lowered:
+            index = lowered.index('since')
+            since, words = ' '.join(words[index + 1:]), words[:index]
+        try:
+            since = ChartServer.since_date(data, since)
+        except (ValueError, TypeError):
+            return ('invalid date', since), f"Invalid date {since!r}, expected YYYY-MM-DD."
+        suffix = '' if since == data.start_date else f" since {since.strftime('%Y-%m-%d')}"
+
+        chart = BOT_COMMANDS[command]
+        if chart is None:
+            page = int(words[0]) if words and words[0].isdigit() else 1
+            try:
+                key, build = self.charts.comparison(data, since, page)
+            except LookupError as e:
+                return ('no page', page, since), f"{e}."
+            return key, build, f"Strategy comparison{suffix}" + (f", page {page}" if page > 1 else "")
+
+        # The strategy's words in any order, optionally followed by timeframes
+        given = collections.Counter(word.lower() for word in words)
+        for strategy, ranges in data.registry.items():
+            name = collections.Counter(strategy.lower().split())
+            timeframes = list((given - name).elements())
+            if not name - given and all(timeframe in ranges for timeframe in timeframes):
+                key, build = self.charts.strategy_chart(data, strategy, chart, since, timeframes or None)
+                label = ' '.join([strategy, *timeframes])
+                return key, build, f"{label} {chart.replace('-', ' ')}{suffix}"
+        return ('unknown strategy', ' '.join(words)), f"Unknown strategy {' '.join(words)!r}.\n\n{self.usage(data)}"
+
+    @staticmethod
+    def usage(data):
+        lines = [
+            "/winrate STRATEGY [TIMEFRAME] [since YYYY-MM-DD]",
+            "/fees STRATEGY [TIMEFRAME] [since YYYY-MM-DD]",
+            "/cumulative STRATEGY [TIMEFRAME] [since YYYY-MM-DD]",
+            "/compare [PAGE] [since YYYY-MM-DD]",
+        ]
+        if data is not None:
+            lines.append("")
+            lines.extend(f"{strategy}: {', '.join(timeframes)}" for strategy, timeframes in data.registry.items())
+        return '\n'.join(lines)
+
+    def claim(self, key):
+        """Whether to answer for ``key``, i.e. it was not answered within the cooldown."""
+        now = time.monotonic()
+        self.answered = {k: t for k, t in self.answered.items() if now - t < self.cooldown}
+        if key in self.answered:
+            return False
+        self.answered[key] = now
+        return True
+
+    def release(self, key):
+        """Let ``key`` be asked for again right away, after its answer failed."""
+        self.answered.pop(key, None)
+        self.answered.pop(('repeated', key), None)
+
+    async def answer(self, telegram, message):
+        request = self.request(_chart_data, message.text)
+        if request is None:
+            return
+        reply = {'reply_to_message_id': message.message_id}
+        if not self.claim(request[0]):
+            logger.info(f"Not answering repeated command {message.text!r}")
+            # One notice per answer and cooldown, so repeats do not go unanswered
+            if self.claim(('repeated', request[0])):
+                await telegram.send_message(
+                    f"This was just asked for: it is answered once every {self.cooldown} seconds, see above.",
+                    **reply
+                )
+            return
+        logger.info(f"Answering command {message.text!r}")
+        if len(request) == 2:
+            await telegram.send_message(request[1], **reply)
+            return
+
+        key, build, caption = request
+        # Sent by file_id if uploaded before, without rendering it again
+        if await telegram.send_photo(None, caption, key, **reply):
+            return
+        try:
+            image = await asyncio.to_thread(self.charts.chart, key, build)
+        except Exception as e:
+            logger.error(f"❌ Error rendering {caption}: {str(e) or type(e).__name__}")
+            self.release(key)
+            await telegram.send_message(f"Could not render the chart: {str(e) or type(e).__name__}", **reply)
+            return
+        if not await telegram.send_photo(image, caption, key, **reply):
+            self.release(key)
+
+def import_time_report(target='pipeline', top=15):
+    """
+    Print a ``python -X importtime`` breakdown of what startup imports cost.
+
+    ``target`` is 'startup' for ``import hei_chart`` alone or 'pipeline' to also
+    load every library a full run needs. Returns the child's exit status.
+    """
+    code = 'import hei_chart'
+    if target == 'pipeline':
+        code += '; hei_chart.import_runtime_dependencies()'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+
+    # Lines look like "import time:   self [us] |  cumulative | <indent>package"
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        return result.returncode
+
+    top_level = sorted((m for m in modules if m[1] == 0), key=lambda m: m[3], reverse=True)
+    total_ms = sum(m[3] for m in top_level) / 1000
+
+    print(f"Import time for '{target}': {total_ms:.1f} ms across {len(modules)} modules\n")
+    print(f"{'cumulative ms':>14}  {'share':>6}  top-level import")
+    for name, _, _, cumulative_us in top_level[:top]:
+        share = cumulative_us / 1000 / total_ms * 100 if total_ms else 0
+        print(f"{cumulative_us / 1000:>14.1f}  {share:>5.1f}%  {name}")
+
+    print(f"\n{'self ms':>14}  module")
+    for name, _, self_us, _ in sorted(modules, key=lambda m: m[2], reverse=True)[:top]:
+        print(f"{self_us / 1000:>14.1f}  {name}")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate trading analysis charts and send them to Telegram.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="stay resident and run the update on a schedule")
+    parser.add_argument('--interval', type=int, default=RUN_INTERVAL,
+                        help="seconds between scheduled runs (default: %(default)s)")
+    parser.add_argument('--offset', type=int, default=RUN_OFFSET,
+                        help="seconds past each interval boundary to start a run (default: %(default)s)")
+    parser.add_argument('--timeout', type=int, default=RUN_TIMEOUT,
+                        help="time limit for a single run in seconds, 0 for none (default: %(default)s)")
+    parser.add_argument('--import-profile', nargs='?', const='pipeline', choices=['startup', 'pipeline'],
+                        help="print an import-time breakdown of module startup ('startup') or of "
+                             "everything a run loads ('pipeline', the default) and exit")
+    snapshot = parser.add_mutually_exclusive_group()
+    snapshot.add_argument('--record', nargs='?', const=SNAPSHOT_DIR, metavar='DIR',
+                          help="save the spreadsheet's strategy tabs to a snapshot in DIR, then run "
+                               "from it (default: %(const)s)")
+    snapshot.add_argument('--replay', nargs='?', const=SNAPSHOT_DIR, metavar='DIR',
+                          help="read the spreadsheet from the snapshot in DIR instead of Google Sheets "
+                               "(default: %(const)s); caches, metrics and the update are written to a "
+                               "temporary directory and nothing is sent to Telegram")
+    parser.add_argument('--serve', nargs='?', type=int, const=CHART_SERVER_PORT, metavar='PORT',
+                        help="also serve charts over HTTP on PORT, rendered on demand from the latest "
+                             "data (default: %(const)s); without --daemon the data is kept up to date "
+                             "on the schedule and nothing is sent to Telegram")
+    parser.add_argument('--bot', action='store_true',
+                        help="also answer chart commands sent to the Telegram chat (/winrate, /fees, "
+                             "/cumulative, /compare) from the latest data; without --daemon the data is "
+                             "kept up to date on the schedule and no updates are sent")
+    args = parser.parse_args(argv)
+    if args.record and args.daemon:
+        parser.error("--record records a single run and cannot be used with --daemon")
+    if args.replay and args.bot:
+        parser.error("--replay never posts to Telegram and cannot be used with --bot")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.import_profile:
+        sys.exit(import_time_report(args.import_profile))
+
+    configure_logging()
+    if args.replay:
+        use_sheets_snapshot(args.replay)
+        use_replay_sandbox()
+    validate_config(telegram=not args.replay and (args.daemon or args.bot or args.serve is None))
+    try:
+        if args.record:
+            record_sheets_snapshot(SPREADSHEET_ID, args.record)
+            use_sheets_snapshot(args.record)
+        if args.daemon or args.bot or args.serve is not None:
+            run_daemon(args.interval, args.offset, args.timeout,
+                       push=args.daemon, serve=args.serve, bot=args.bot)
+        else:
+            run_once(args.timeout)
     except KeyboardInterrupt:
         logger.info("Process interrupted by user")
         sys.exit(0)
+    except RunTimeout as e:
+        logger.critical(f"Run aborted: {str(e)}")
+        sys.exit(1)
     except Exception as e:
         logger.critical("Unhandled exception", exc_info=True)
         sys.exit(1)
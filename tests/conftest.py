@@ -0,0 +1,58 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from benchmark import BENCHMARK_ENV  # noqa: E402
+
+# hei_chart reads its settings on import
+os.environ.update(BENCHMARK_ENV, LOG_LEVEL='WARNING')
+
+START_DATE = BENCHMARK_ENV['REPORT_START_DATE']
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An empty working directory with a ``charts`` folder and its own cache."""
+    import hei_chart
+
+    (tmp_path / 'charts').mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(hei_chart, 'CACHE_DIR', tmp_path / 'cache')
+    return tmp_path
+
+
+@pytest.fixture
+def trade_stats():
+    """Build the ``TradeStats`` of a synthetic tab of ``rows`` trades."""
+    import hei_chart
+    from benchmark import SyntheticSheetsClient, synthetic_tab
+
+    def build(rows, seed=0):
+        range_name = 'tab!A:L'
+        values = SyntheticSheetsClient({'tab': synthetic_tab(rows, seed)}).get_values('test', range_name)
+        stats = hei_chart.TradeStats(START_DATE)
+        stats.update(hei_chart.parse_sheet_values(values, range_name))
+        return stats
+
+    return build
+
+
+@pytest.fixture
+def publish_strategies(workdir, trade_stats, monkeypatch):
+    """Publish ``count`` strategies ``ETH +0``, ``ETH +1``... with one 3m timeframe each as the chart data."""
+    import hei_chart
+
+    monkeypatch.setattr(hei_chart, '_chart_data', None)
+
+    def publish(count):
+        registry = {f'ETH +{i}': {'3m': f'tab {i}!A:L'} for i in range(count)}
+        stats = {f'tab {i}!A:L': trade_stats(100, seed=i) for i in range(count)}
+        hei_chart.publish_chart_data(registry, stats, START_DATE)
+        return registry
+
+    return publish
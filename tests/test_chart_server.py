@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+import hei_chart
+
+
+@pytest.fixture
+def chart_server(publish_strategies):
+    """A ``ChartServer`` answering from 65 published strategies."""
+    publish_strategies(65)
+    return hei_chart.ChartServer()
+
+
+def test_comparison_is_paginated(chart_server):
+    status, _, body = chart_server.respond('/charts')
+    assert status == 200
+    assert json.loads(body)['comparison_pages'] == 3
+
+    etags = set()
+    for page in (1, 2, 3):
+        status, headers, body = chart_server.respond(f'/charts/comparison?page={page}')
+        assert status == 200 and body
+        etags.add(headers['ETag'])
+    assert len(etags) == 3
+
+    assert chart_server.respond('/charts/comparison?page=4')[0] == 404
+    assert chart_server.respond('/charts/comparison?page=x')[0] == 400
+
+
+def test_comparison_without_trades_in_range(chart_server):
+    status, headers, body = chart_server.respond('/charts/comparison?since=2099-01-01')
+    assert status == 404
+    assert body == b"No trades with fees since 2099-01-01"
@@ -0,0 +1,42 @@
+import pytest
+
+import hei_chart
+
+START_DATE = hei_chart.pd.Timestamp(hei_chart.REPORT_START_DATE)
+
+
+def test_fee_distribution_of_no_fees():
+    assert hei_chart.fee_distribution([]) is None
+    assert hei_chart.fee_distribution([float('nan')]) is None
+
+
+@pytest.mark.parametrize('empty', ['no trades', 'none in range'])
+@pytest.mark.parametrize('create_chart', [
+    hei_chart.create_combined_win_rate_chart,
+    hei_chart.create_combined_fee_distribution_chart,
+    hei_chart.create_gap_tracking_chart,
+])
+def test_strategy_chart_with_an_empty_timeframe(workdir, trade_stats, create_chart, empty):
+    if empty == 'no trades':
+        empty_stats = hei_chart.TradeStats(START_DATE)
+    else:
+        empty_stats = trade_stats(200).since(hei_chart.pd.Timestamp('2099-01-01'))
+    timeframe_stats = {'3m': trade_stats(500), '5m': empty_stats}
+    filename = create_chart(timeframe_stats, 'ETH +50', str(workdir))
+    assert (workdir / filename).stat().st_size > 0
+
+    # The empty panel comes back once its timeframe has trades
+    timeframe_stats['5m'] = trade_stats(500, seed=1)
+    filename = create_chart(timeframe_stats, 'ETH +50', str(workdir))
+    assert (workdir / filename).stat().st_size > 0
+
+
+def test_comparison_pages(trade_stats):
+    stats = trade_stats(100)
+    strategy_stats = {f'ETH +{i} 3m': stats for i in range(65)}
+    strategy_stats['ETH +99 3m'] = hei_chart.TradeStats(START_DATE)
+
+    pages = hei_chart.comparison_pages(strategy_stats, page_size=30)
+    assert [len(page) for page in pages] == [30, 30, 5]
+    assert 'ETH +99 3m' not in pages[-1]
+    assert hei_chart.comparison_pages({'ETH +99 3m': hei_chart.TradeStats(START_DATE)}) == []
@@ -0,0 +1,27 @@
+import threading
+
+import hei_chart
+
+
+def test_run_metrics_only_count_the_run_context():
+    metrics = hei_chart.RunMetrics()
+    token = hei_chart._run_metrics.set(metrics)
+    metrics.start()
+    try:
+        with hei_chart.measure('parse'):
+            hei_chart.logger.error("Error in the run")
+
+        # A chart server or bot thread working meanwhile
+        def serve():
+            with hei_chart.measure('chart'):
+                hei_chart.logger.error("Error outside the run")
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        thread.join()
+    finally:
+        hei_chart._run_metrics.reset(token)
+        metrics.finish('ok')
+
+    assert [record['stage'] for record in metrics.records] == ['parse']
+    assert metrics.errors == 1
@@ -0,0 +1,28 @@
+import hei_chart
+from benchmark import SyntheticSheetsClient, synthetic_tab
+
+
+def test_replay_writes_the_update_instead_of_sending_it(workdir, monkeypatch):
+    for name in ('_sheets_client', 'SPREADSHEET_ID', 'CACHE_DIR', 'METRICS_TEXTFILE', 'METRICS_JSONL',
+                 '_delivery_factory'):
+        monkeypatch.setattr(hei_chart, name, getattr(hei_chart, name))
+    # Any request to Telegram fails
+    monkeypatch.setattr(hei_chart, 'TELEGRAM_API_URL', 'http://127.0.0.1:9/bot')
+
+    tabs = {name: synthetic_tab(300, seed) for seed, name in enumerate(['(+50) ETH 3m', '(+50) ETH 5m'])}
+    hei_chart._sheets_client = SyntheticSheetsClient(tabs)
+    hei_chart.record_sheets_snapshot(hei_chart.SPREADSHEET_ID, workdir / 'snapshot')
+    hei_chart.use_sheets_snapshot(workdir / 'snapshot')
+    sandbox = hei_chart.use_replay_sandbox(workdir / 'replay')
+    hei_chart.run_once()
+
+    sent, = (sandbox / 'sent').iterdir()
+    assert sorted(path.name for path in sent.glob('*.png')) == [
+        '001_strategy_comparison.png',
+        '002_win_rate_comparison_ETH_+50.png',
+        '003_fee_distribution_comparison_ETH_+50.png',
+        '004_fee_tracking_ETH_+50.png',
+    ]
+    assert '❌' not in (sent / 'messages.txt').read_text(encoding='utf-8')
+    assert (sandbox / 'cache').is_dir() and not (workdir / 'cache').exists()
+    assert (sandbox / 'metrics.jsonl').exists()
@@ -0,0 +1,54 @@
+import json
+
+import hei_chart
+from benchmark import SyntheticSheetsClient, append_rows, synthetic_tab
+
+
+def append_raw_row(tab, row):
+    """Return ``tab`` with one more row of exactly the cells ``row``."""
+    data, offsets = tab
+    line = json.dumps(row).encode()
+    return data + b',' + line, offsets + [offsets[-1] + len(line) + 1]
+
+
+def test_a_row_without_date_is_synced_once_it_has_one(workdir, monkeypatch):
+    monkeypatch.setattr(hei_chart, '_sheets_client', None)
+    range_name = 'tab!A:L'
+    client = hei_chart._sheets_client = SyntheticSheetsClient({'tab': synthetic_tab(50, 0)})
+    errors = {}
+    assert len(hei_chart.sync_data_from_sheets('test', [range_name], errors)[range_name]) == 50
+
+    # A trade still being filled in
+    filled = append_rows(client.tabs['tab'], 1, 1)
+    client.tabs['tab'] = append_raw_row(client.tabs['tab'], [None, None, 'ETH'])
+    frame = hei_chart.sync_data_from_sheets('test', [range_name], errors)[range_name]
+    assert not errors
+    assert len(frame) == 50
+
+    client.tabs['tab'] = filled
+    frame = hei_chart.sync_data_from_sheets('test', [range_name], errors)[range_name]
+    assert not errors
+    full = hei_chart.parse_sheet_values(client.get_values('test', range_name), range_name)
+    assert len(frame) == 51
+    assert frame['DateTime'].equals(full['DateTime'])
+
+
+def test_cached_revision_reuses_the_synced_frame(workdir, monkeypatch):
+    monkeypatch.setattr(hei_chart, '_sheets_client', None)
+    range_name = 'tab!A:L'
+    client = hei_chart._sheets_client = SyntheticSheetsClient({'tab': synthetic_tab(50, 0)})
+    assert len(hei_chart.load_trade_data('test', [range_name])[range_name]) == 50
+
+    # The cache entry only points at the frame saved with the sync state
+    entry = hei_chart._load_pickle(hei_chart._cache_file('parsed', 'test', range_name))
+    assert 'frame' not in entry
+    requests = client.requests
+    assert len(hei_chart.load_trade_data('test', [range_name])[range_name]) == 50
+    assert client.requests == requests
+
+    client.tabs['tab'] = append_rows(client.tabs['tab'], 5, 1)
+    client.revision += 1
+    assert len(hei_chart.load_trade_data('test', [range_name])[range_name]) == 55
+    requests = client.requests
+    assert len(hei_chart.load_trade_data('test', [range_name])[range_name]) == 55
+    assert client.requests == requests
@@ -0,0 +1,115 @@
+import json
+import time
+
+import pytest
+
+import hei_chart
+from benchmark import FakeBotAPI
+
+
+@pytest.fixture
+def bot_api(workdir, monkeypatch):
+    api = FakeBotAPI()
+    monkeypatch.setattr(hei_chart, 'TELEGRAM_API_URL', api.url)
+    yield api
+    api.close()
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def polling(api):
+    """Whether the commands skipped the messages sent before they started and now wait for new ones."""
+    return any(call['method'] == 'getUpdates' and call['params'].get('timeout') for call in api.calls)
+
+
+def replies_to(api, update):
+    message_id = update['message']['message_id']
+    return [call for call in api.calls if call['params'].get('reply_to_message_id') == message_id
+            or call['params'].get('reply_parameters', {}).get('message_id') == message_id]
+
+
+def test_chart_command_end_to_end(publish_strategies, bot_api, workdir):
+    publish_strategies(2)
+    commands = hei_chart.TelegramCommands(cooldown=60, poll_timeout=1).start()
+    try:
+        wait_for(lambda: polling(bot_api))
+
+        # The chart is rendered and uploaded in reply to the command
+        command = bot_api.send_update('/winrate ETH +1')
+        wait_for(lambda: replies_to(bot_api, command))
+        reply, = replies_to(bot_api, command)
+        assert reply['method'] == 'sendPhoto'
+
+        # Asking again within the cooldown gets a notice instead of the chart
+        repeat = bot_api.send_update('/winrate ETH +1')
+        wait_for(lambda: replies_to(bot_api, repeat))
+        notice, = replies_to(bot_api, repeat)
+        assert notice['method'] == 'sendMessage'
+        assert 'once every 60 seconds' in notice['params']['text']
+
+        # Messages of other chats are not answered
+        other = bot_api.send_update('/winrate ETH +0', chat_id=2)
+        wait_for(lambda: any(call['method'] == 'getUpdates' and call['params'].get('offset', 0) > other['update_id']
+                             for call in bot_api.calls))
+    finally:
+        commands.shutdown()
+
+    assert [call['method'] for call in bot_api.calls].count('sendPhoto') == 1
+    file_ids = json.loads((workdir / 'cache' / 'telegram_file_ids.json').read_text())
+    assert len(file_ids['1']) == 1
+
+
+def test_file_id_saves_are_merged(workdir):
+    class Bot:
+        id = 1
+
+    first, second = hei_chart.TelegramDelivery(), hei_chart.TelegramDelivery()
+    for telegram in (first, second):
+        telegram.bot = Bot()
+        telegram._load_file_ids()
+
+    class Message:
+        def __init__(self, file_id):
+            self.photo = [type('PhotoSize', (), {'file_id': file_id})]
+
+    first._remember_file_id('a', Message('file-a'))
+    first._remember_file_id('stale', Message('file-stale'))
+    first._save_file_ids()
+    second._remember_file_id('b', Message('file-b'))
+    second._save_file_ids()
+    first._forget_file_id('stale')
+    first._save_file_ids()
+
+    stored = json.loads((workdir / 'cache' / 'telegram_file_ids.json').read_text())
+    assert stored == {'1': {'b': 'file-b', 'a': 'file-a'}}
+    assert list((workdir / 'cache').iterdir()) == [workdir / 'cache' / 'telegram_file_ids.json']
+
+
+def test_failed_chart_can_be_asked_for_again(publish_strategies, bot_api, monkeypatch):
+    publish_strategies(1)
+    render = hei_chart.ChartServer.render
+    failures = iter([RuntimeError("render failed")])
+
+    def flaky_render(*args):
+        for error in failures:
+            raise error
+        return render(*args)
+
+    monkeypatch.setattr(hei_chart.ChartServer, 'render', staticmethod(flaky_render))
+    commands = hei_chart.TelegramCommands(cooldown=60, poll_timeout=1).start()
+    try:
+        wait_for(lambda: polling(bot_api))
+        failed = bot_api.send_update('/fees ETH +0')
+        wait_for(lambda: replies_to(bot_api, failed))
+        assert [call['method'] for call in replies_to(bot_api, failed)] == ['sendMessage']
+
+        retry = bot_api.send_update('/fees ETH +0')
+        wait_for(lambda: replies_to(bot_api, retry))
+        assert [call['method'] for call in replies_to(bot_api, retry)] == ['sendPhoto']
+    finally:
+        commands.shutdown()
@@ -0,0 +1,14 @@
+import copy
+import pickle
+
+import numpy as np
+
+
+def test_copies_share_the_series_and_pickles_trim_it(trade_stats):
+    stats = trade_stats(1000)
+    assert copy.copy(stats)._series is stats._series
+
+    restored = pickle.loads(pickle.dumps(stats))
+    assert len(restored._series) == stats.length
+    assert np.array_equal(restored.series, stats.series)
+    assert restored.fee_total == stats.fee_total